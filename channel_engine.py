@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""channel_engine.py
+
+NumPy implementation of the K-segment nonlinear fiber channel.
+
+Each segment rotates the signal by a phase proportional to its instantaneous power,
+theta = gamma * L / K * |x|^2, and then adds Gaussian noise with standard deviation sigma per real dimension.
+The signal is kept as a complex vector, the K x 2 x N noise samples are drawn with a single call
+and all segments are applied in place over buffers that are reused between calls,
+so the same engine serves both the receiver training samples and the large SER evaluations.
+
+For importance sampling, propagate() can enlarge the noise component common to all segments by noise_scale.
+Only this 2-dimensional component is biased, so the likelihood ratios returned by log_likelihood_ratio()
+stay well behaved, while the accumulated noise, which decides most symbol errors, gets noise_scale times larger.
+
+"""
+
+import numpy as np
+
+# Parameters for fiber channel:
+gamma = 1.27  # non-linearity parameter
+L = 2000  # total link length
+K = 20  # number of segments
+P_noise_dBm = -21.3  # dBm
+P_noise_W = 10 ** (P_noise_dBm / 10) / 1000
+sigma = np.sqrt(P_noise_W / K) / np.sqrt(2)
+
+
+class FiberChannel(object):
+    """K-segment nonlinear phase noise channel operating on [..., 2, N] signals.
+
+    Leading axes (e.g. one entry per input power) are propagated together and share the same noise realization,
+    unless propagate() is called with shared_noise=False.
+    """
+
+    def __init__(self, noise_std=sigma, gamma=gamma, L=L, K=K, seed=None):
+        self.noise_std = noise_std
+        self.K = K
+        self.nonlinear_coef = gamma * L / K
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.noise_size = 0
+        self.noise_scale = 1
+
+    def allocate(self, lead_shape, num_inputs, shared_noise=True):
+        # buffers only grow, smaller batches use a prefix of them
+        size = int(np.prod(lead_shape)) * num_inputs
+        noise_shape = (num_inputs,) if shared_noise else tuple(lead_shape) + (num_inputs,)
+        noise_size = num_inputs if shared_noise else size
+        if size > self.size:
+            self.z = np.empty(size, dtype=np.complex128)
+            self.theta = np.empty(size)
+            self.phase = np.empty(size, dtype=np.complex128)
+            self.out = np.empty(2 * size)
+            self.size = size
+        if noise_size > self.noise_size:
+            self.noise = np.empty(self.K * noise_size, dtype=np.complex128)
+            self.noise_size = noise_size
+        self.noise_shape = noise_shape
+        shape = tuple(lead_shape) + (num_inputs,)
+        return (self.z[:size].reshape(shape), self.theta[:size].reshape(shape), self.phase[:size].reshape(shape),
+                self.noise[:self.K * noise_size].reshape((self.K,) + noise_shape),
+                self.out[:2 * size].reshape(tuple(lead_shape) + (2, num_inputs)))
+
+    def propagate(self, channel_input, labels=None, noise_scale=1, shared_noise=True):
+        """Send channel_input [..., 2, N] through the fiber; returns the received [..., 2, N] signal.
+
+        If labels is given, channel_input holds the M constellation points [..., 2, M] and
+        the transmitted sequence is channel_input[..., labels].
+        The returned array is a view of an internal buffer, overwritten by the next call.
+        With noise_scale != 1 the noise is drawn from the biased distribution, see log_likelihood_ratio().
+        With shared_noise=False every leading entry gets its own noise realization.
+        """
+        points = channel_input[..., 0, :] + 1j * channel_input[..., 1, :]
+        num_inputs = points.shape[-1] if labels is None else labels.size
+        z, theta, phase, noise, out = self.allocate(points.shape[:-1], num_inputs, shared_noise)
+
+        if labels is None:
+            z[...] = points
+        else:
+            np.take(points, labels, axis=-1, out=z)
+
+        # all K x 2 x N noise samples in one draw, real and imaginary parts side by side
+        noise_view = noise.view(np.float64)
+        self.rng.standard_normal(out=noise_view)
+        noise_view *= self.noise_std
+        if noise_scale != 1:
+            # scale the mean over segments, i.e. the common noise component, leave the rest unchanged
+            noise += (noise_scale - 1) * np.mean(noise, axis=0)
+        self.noise_scale = noise_scale
+
+        for k in range(0, self.K):
+            np.multiply(z.real, z.real, out=theta)
+            theta += z.imag * z.imag
+            theta *= self.nonlinear_coef
+            np.cos(theta, out=phase.real)
+            np.sin(theta, out=phase.imag)
+            z *= phase
+            z += noise[k]
+
+        out[..., 0, :] = z.real
+        out[..., 1, :] = z.imag
+        return out
+
+    def log_likelihood_ratio(self):
+        """Log of p(noise) / q(noise) for every sample of the last propagate() call, shape [N].
+
+        p is the true noise distribution and q the one with the common component scaled by noise_scale.
+        The weights are shared by all leading axes, as the noise realization is
+        (one weight per leading entry and sample with shared_noise=False).
+        """
+        s = self.noise_scale
+        noise = self.noise[:self.K * int(np.prod(self.noise_shape))].reshape((self.K,) + self.noise_shape)
+        # common component sqrt(K) * mean_k(noise_k), standardized: std 1 under p and s under q per real dimension
+        common = np.sqrt(self.K) * np.mean(noise, axis=0) / self.noise_std
+        return 2 * np.log(s) - (1 - 1 / s ** 2) / 2 * (common.real ** 2 + common.imag ** 2)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""convergence_monitor.py
+
+Convergence detection and early stopping for the alternating training loop.
+
+train() calls monitor.update() at the end of every main loop; once it returns True the main loops stop
+and the large-batch finale runs as usual.
+Every window main loops, ConvergenceMonitor compares the mean receiver cross entropy of the last window
+with the mean of the window before, and optionally estimates the SER with SER_num copies of every message.
+Training has converged when neither improved by more than its tolerance (relative) over the previous check;
+for an ensemble all realizations have to converge.
+The SER estimates are noisy, so the SER only counts as converged once the confidence interval of
+the improvement lies below SER_tolerance: the smaller the SER, the more symbols a check needs to ever stop.
+
+The SER sweep scripts stop early only when their early_stopping dict is set (it is None by default), and their
+results then carry it in their cache key. Early stopping saves most of the main loops but ends at a higher SER:
+at -5 dBm, dict(window=100, tolerance=0.01, min_loops=500, check_SER=True, SER_num=20000) stopped after 500 to 900
+of 4000 main loops at an SER of 9.0e-3 to 1.05e-2, against 6.8e-3 to 7.5e-3 for the full schedule.
+
+"""
+
+import numpy as np
+from ser_evaluation import streaming_SER, normal_quantile
+
+
+def early_stopping_monitor(early_stopping, input_power=None):
+    # the scripts give the keyword arguments of a ConvergenceMonitor as an early_stopping dict, None trains them all
+    return None if early_stopping is None else ConvergenceMonitor(input_power=input_power, **early_stopping)
+
+
+class ConvergenceMonitor(object):
+    """Stops the main loops once the smoothed cross entropy, and the SER with check_SER, stop improving."""
+
+    def __init__(self, window=100, tolerance=0.01, min_loops=200, check_SER=False, SER_tolerance=0.05, SER_num=2000,
+                 confidence=0.95, input_power=None):
+        self.window = window
+        self.tolerance = tolerance
+        self.min_loops = min_loops  # never stop before this many main loops
+        self.check_SER = check_SER
+        self.SER_tolerance = SER_tolerance  # the SER estimate is noisy, so it gets a looser threshold
+        self.SER_num = SER_num  # copies of every message per SER estimate
+        self.z = normal_quantile(0.5 + confidence / 2)
+        self.input_power = input_power
+        self.cross_entropy = []
+        self.SER = []  # estimate at every check
+        self.counter = None  # error counts of the last check
+        self.stopped_at = None
+
+    def get_state(self):
+        # the history of the checks, saved in training checkpoints
+        return {'cross_entropy': list(self.cross_entropy), 'SER': list(self.SER), 'counter': self.counter,
+                'stopped_at': self.stopped_at}
+
+    def set_state(self, state):
+        self.cross_entropy, self.SER = list(state['cross_entropy']), list(state['SER'])
+        self.counter, self.stopped_at = state['counter'], state['stopped_at']
+
+    def smoothed_cross_entropy(self):
+        # mean over the last window main loops, one value per realization
+        return np.mean(self.cross_entropy[-self.window:], axis=0)
+
+    def SER_improved(self, sess, system):
+        # True unless the improvement over the previous check is below SER_tolerance with the given confidence
+        previous, self.counter = self.counter, streaming_SER(sess, system, self.SER_num, self.input_power)
+        self.SER.append(np.atleast_1d(self.counter.SER))
+        if previous is None:
+            return True
+        current = self.counter
+        std_error = np.sqrt(previous.SER * (1 - previous.SER) / previous.symbols
+                            + current.SER * (1 - current.SER) / current.symbols)
+        return np.any(previous.SER - current.SER + self.z * std_error > self.SER_tolerance * previous.SER)
+
+    def converged(self, sess, system):
+        # both criteria are evaluated, so that the SER is estimated at every check
+        SER_improved = self.check_SER and self.SER_improved(sess, system)
+        if len(self.cross_entropy) < max(self.min_loops, 2 * self.window):
+            return False
+        previous = np.mean(self.cross_entropy[-2 * self.window:-self.window], axis=0)
+        current = self.smoothed_cross_entropy()
+        return np.all(previous - current < self.tolerance * previous) and not SER_improved
+
+    def update(self, sess, system, loop, cross_entropy, reward):
+        # cross_entropy is the value returned by train_receiver, one value per realization for an ensemble
+        self.cross_entropy.append(np.atleast_1d(cross_entropy))
+        if (loop + 1) % self.window == 0 and self.converged(sess, system):
+            self.stopped_at = loop + 1
+            return True
+        return False
+
+    def iterations_saved(self, Main_loops):
+        return 0 if self.stopped_at is None else Main_loops - self.stopped_at
+
+    def report(self, Main_loops):
+        if self.stopped_at is None:
+            print('not converged after %d main loops' % Main_loops)
+        else:
+            print('converged after %d of %d main loops, %d saved' % (self.stopped_at, Main_loops,
+                                                                     self.iterations_saved(Main_loops)))
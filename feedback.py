@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""feedback.py
+
+Feedback stages used between the receiver and the transmitter during alternating training.
+
+The receiver computes one loss per transmitted sample and sends it back to the transmitter
+through one of the following stages:
+* PerfectFeedback: the real per sample loss is sent to the transmitter
+* ScaledFeedback: sample losses are first clipped, then shifted to a interval of
+                  [0, max(sample_loss)- min(sample_loss)], then scaled to [0, 1]
+                  The clipping boundary is found by selection (np.partition, top_k in the graph) in linear time,
+                  or read off a histogram carried across updates by a StreamingQuantile
+* QuantizedFeedback: the scaled sample losses are quantized with num_bits bits, uniformly unless
+                     another quantizer is given, e.g. an AdaptiveQuantizer (see quantization.py)
+* FlippedFeedback: the quantization bits are flipped with probability flipping_rate, or go through
+                   another error model of the feedback link (see feedback_channel.py)
+
+At transmitter side the received sample losses are decoded to values between [0, 1]
+feedback_bits(num_samples) is the size of the feedback of num_samples sample losses on the link,
+64 bits per unquantized loss and num_bits per quantized one. codebook_bits() is the size of the codebooks
+an adaptive quantizer has sent so far, on top of the sample losses (see FiberSystem.host_feedback()).
+On the host the quantization bits travel packed, 8 per byte (see pack_indexes() in quantization.py);
+the graph ops carry them as an int32 [..., N, num_bits] tensor of 0/1 values instead, unpacked.
+
+Every stage works both on NumPy arrays (calling the stage) and as graph ops (graph()),
+the latter lets the whole transmitter update run inside one session call.
+The graph ops act along the last axis, so the [R, N] sample losses of an ensemble are processed per realization.
+"""
+
+import numpy as np
+import tensorflow as tf
+from quantization import ScalarQuantizer, pack_indexes, unpack_indexes, int2bin_graph, bin2int_graph
+from feedback_channel import BinarySymmetricChannel
+
+
+class PerfectFeedback(object):
+    """The real per sample loss is sent to the transmitter."""
+
+    def __call__(self, sample_loss):
+        return sample_loss
+
+    def graph(self, sample_loss):
+        return sample_loss
+
+    def feedback_bits(self, num_samples):
+        return 64 * num_samples  # float64 losses
+
+    def codebook_bits(self):
+        return 0
+
+    def get_state(self):
+        # state carried across updates, saved in training checkpoints
+        return {}
+
+    def set_state(self, state):
+        pass
+
+
+class StreamingQuantile(object):
+    """Running estimate of the clip_ratio quantile of the sample losses, from a histogram on log-spaced bins.
+
+    As the running histogram of an AdaptiveQuantizer, every update() decays the histogram by decay and adds
+    the samples, each binned in O(1) without any selection; the quantile is interpolated from the cumulative
+    histogram in O(bins). Losses below low or above high count in the first or the last bin.
+    """
+
+    def __init__(self, clip_ratio=0.95, decay=0.9, low=1e-8, high=1e4, bins=1024):
+        self.clip_ratio = clip_ratio
+        self.decay = decay
+        self.log_edges = np.linspace(np.log(low), np.log(high), bins + 1)
+        self.histogram = np.zeros(bins)
+        self.value = None
+
+    def update(self, sample_loss):
+        bins = self.histogram.size
+        log_loss = np.log(np.maximum(np.ravel(sample_loss), np.finfo(np.float64).tiny))
+        cells = np.clip(((log_loss - self.log_edges[0]) * (bins / (self.log_edges[-1] - self.log_edges[0])))
+                        .astype(int), 0, bins - 1)
+        self.histogram = self.decay * self.histogram + np.bincount(cells, minlength=bins) / cells.size
+        cdf = np.concatenate([[0], np.cumsum(self.histogram)])
+        self.value = np.exp(np.interp(self.clip_ratio * cdf[-1], cdf, self.log_edges))
+        return self.value
+
+    def get_state(self):
+        return {'histogram': self.histogram.copy(), 'value': self.value}
+
+    def set_state(self, state):
+        self.histogram, self.value = state['histogram'], state['value']
+
+
+class ScaledFeedback(object):
+    """Sample losses are clipped at the clip_ratio order statistic and scaled to [0, 1].
+
+    With streaming=True the clipping boundary is a StreamingQuantile carried across updates instead,
+    which smooths it between batches and needs no selection; as its histogram lives on the host, so does the stage.
+    """
+
+    def __init__(self, clip_ratio=0.95, streaming=False):
+        self.clip_ratio = clip_ratio
+        self.streaming_quantile = StreamingQuantile(clip_ratio) if streaming else None
+        if streaming:
+            self.graph = None
+
+    def clipping_boundary(self, sample_loss):
+        if self.streaming_quantile is not None:
+            return self.streaming_quantile.update(sample_loss)
+        boundary_indx = int(self.clip_ratio * sample_loss.size)  # find index for clipping
+        # only the boundary_indx-th smallest sample loss is needed, selection instead of a full sort
+        return np.partition(sample_loss, boundary_indx)[boundary_indx]
+
+    def preprocess(self, sample_loss):
+        # clipping operation
+        sample_loss = np.minimum(sample_loss, self.clipping_boundary(sample_loss))
+        # scaling operation, all zero if a streaming boundary clipped every sample
+        scaled_sample_loss = (sample_loss - np.min(sample_loss)) / np.maximum(np.max(
+            sample_loss - np.min(sample_loss)), np.finfo(np.float64).tiny)
+        return scaled_sample_loss
+
+    def __call__(self, sample_loss):
+        return self.preprocess(sample_loss)
+
+    def get_state(self):
+        return {'streaming_quantile': None if self.streaming_quantile is None else self.streaming_quantile.get_state()}
+
+    def set_state(self, state):
+        if self.streaming_quantile is not None:
+            self.streaming_quantile.set_state(state['streaming_quantile'])
+
+    def preprocess_graph(self, sample_loss):
+        num_samples = tf.shape(sample_loss)[-1]
+        boundary_indx = tf.cast(self.clip_ratio * tf.cast(num_samples, tf.float64), tf.int32)
+        # the boundary_indx-th smallest sample loss is the smallest of the (num_samples - boundary_indx) largest
+        largest_sample_loss = tf.nn.top_k(sample_loss, num_samples - boundary_indx).values
+        sample_loss = tf.minimum(sample_loss, largest_sample_loss[..., -1:])  # clipping operation
+        shifted_sample_loss = sample_loss - tf.reduce_min(sample_loss, axis=-1, keepdims=True)
+        scaled_sample_loss = shifted_sample_loss / tf.reduce_max(shifted_sample_loss, axis=-1,
+                                                                 keepdims=True)  # scaling operation
+        return scaled_sample_loss
+
+    def graph(self, sample_loss):
+        return self.preprocess_graph(sample_loss)
+
+    def feedback_bits(self, num_samples):
+        return 64 * num_samples  # float64 losses
+
+    def codebook_bits(self):
+        return 0
+
+
+class QuantizedFeedback(ScaledFeedback):
+    """Scaled sample losses are quantized with num_bits bits, by quantizer if given (a ScalarQuantizer).
+
+    The bits go through channel if given (see feedback_channel.py); a sample with an erased bit
+    is replaced by the mean of the received ones.
+    """
+
+    def __init__(self, num_bits, clip_ratio=0.95, quantizer=None, channel=None, streaming=False):
+        super(QuantizedFeedback, self).__init__(clip_ratio, streaming)
+        self.quantizer = ScalarQuantizer.uniform(num_bits) if quantizer is None else quantizer
+        self.num_bits = self.quantizer.num_bits
+        self.channel = channel
+        if self.quantizer.adaptive:
+            self.graph = None  # the codebook changes between updates, the stage runs on the host
+        if channel is not None and not hasattr(channel, 'transmit_graph'):
+            self.graph = None  # channel models without graph ops run on the host
+
+    def feedback_bits(self, num_samples):
+        return self.num_bits * num_samples
+
+    def codebook_bits(self):
+        return self.quantizer.codebook_bits()
+
+    def get_state(self):
+        return dict(super(QuantizedFeedback, self).get_state(), quantizer=self.quantizer.get_state(),
+                    channel=None if self.channel is None else self.channel.get_state())
+
+    def set_state(self, state):
+        super(QuantizedFeedback, self).set_state(state)
+        self.quantizer.set_state(state['quantizer'])
+        if self.channel is not None:
+            self.channel.set_state(state['channel'])
+
+    def feedback_link(self, packed_bits):
+        if self.channel is None:
+            return packed_bits, None
+        return self.channel.transmit(packed_bits)
+
+    def __call__(self, sample_loss):
+        scaled_sample_loss = self.preprocess(sample_loss)
+        self.quantizer.update(scaled_sample_loss)
+        indexes_quantized_sample_loss = self.quantizer.quantize(scaled_sample_loss)
+        # the link carries num_bits * N / 8 bytes
+        num_samples = indexes_quantized_sample_loss.size
+        received_bits, erased_bits = self.feedback_link(pack_indexes(indexes_quantized_sample_loss, self.num_bits))
+        int_indexes = unpack_indexes(received_bits, num_samples, self.num_bits)
+        received_sample_loss = self.quantizer.de_quantize(int_indexes)
+        if erased_bits is not None:
+            erased = unpack_indexes(erased_bits, num_samples, self.num_bits) > 0
+            if not np.all(erased):
+                received_sample_loss[erased] = np.mean(received_sample_loss[~erased])
+        return received_sample_loss.reshape(indexes_quantized_sample_loss.shape)
+
+    def feedback_link_graph(self, bin_indexes):
+        if self.channel is None:
+            return bin_indexes
+        return self.channel.transmit_graph(bin_indexes)
+
+    def graph(self, sample_loss):
+        scaled_sample_loss = self.preprocess_graph(sample_loss)
+        indexes_quantized_sample_loss = self.quantizer.quantize_graph(scaled_sample_loss)
+        bin_indexes = int2bin_graph(indexes_quantized_sample_loss, self.num_bits)
+        int_indexes = bin2int_graph(self.feedback_link_graph(bin_indexes))
+        return self.quantizer.de_quantize_graph(int_indexes)
+
+
+class FlippedFeedback(QuantizedFeedback):
+    """Quantization bits are flipped with probability flipping_rate on the feedback link.
+
+    channel replaces the default BinarySymmetricChannel(flipping_rate), e.g. by a GilbertElliottChannel.
+    """
+
+    def __init__(self, num_bits, flipping_rate, clip_ratio=0.95, quantizer=None, channel=None, streaming=False):
+        channel = BinarySymmetricChannel(flipping_rate) if channel is None else channel
+        super(FlippedFeedback, self).__init__(num_bits, clip_ratio, quantizer, channel, streaming)
+        self.flipping_rate = flipping_rate
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""feedback_channel.py
+
+Error models of the binary feedback link, applied to the packed bits of the quantized sample losses
+(see pack_indexes() in quantization.py). The bits of a sample are sent together, sample after sample,
+so a burst hits the consecutive bits of a few consecutive samples.
+
+* BinarySymmetricChannel: every bit is flipped independently with flipping_rate. The flip mask is drawn by comparing
+                          uniform samples with the rate, or for small rates by geometric skip sampling,
+                          which only draws the positions of the flipped bits
+* GilbertElliottChannel: bursts of errors, the link alternates between a good and a bad state
+                         (a Markov chain over the bits) with a flipping rate of its own in each state
+* ErasureChannel: bits are lost with erasure_rate, after an optional inner channel flipping them
+
+transmit(packed_bits) returns the received packed bits and a packed mask of the erased bits (None without erasures).
+The BinarySymmetricChannel also has a graph version, acting on unpacked bits.
+Masks are drawn chunk bytes at a time, so the memory stays bounded whatever the number of bits.
+
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def threshold_mask(num_bytes, probability, chunk=1 << 16):
+    # packed bits that are 1 with probability, from uniform samples
+    mask = np.empty(num_bytes, dtype=np.uint8)
+    for start in range(0, num_bytes, chunk):
+        stop = min(start + chunk, num_bytes)
+        mask[start:stop] = np.packbits(np.random.random_sample((stop - start) * 8) < probability)
+    return mask
+
+
+def skip_mask(num_bytes, probability):
+    # same distribution as threshold_mask, from the geometric gaps between the positions of the 1 bits
+    num_bits = num_bytes * 8
+    mask = np.zeros(num_bytes, dtype=np.uint8)
+    if probability <= 0:
+        return mask
+    position = -1
+    while True:
+        expected = (num_bits - position) * probability
+        gaps = np.random.geometric(probability, int(expected + 5 * np.sqrt(expected)) + 16)
+        positions = position + np.cumsum(gaps)
+        positions = positions[positions < num_bits]
+        np.bitwise_or.at(mask, positions >> 3, (128 >> (positions & 7)).astype(np.uint8))
+        if positions.size < gaps.size:
+            return mask
+        position = positions[-1]
+
+
+class BinarySymmetricChannel(object):
+    """Every bit is flipped with flipping_rate, positions are skip-sampled below skip_below."""
+
+    def __init__(self, flipping_rate, skip_below=0.05):
+        self.flipping_rate = flipping_rate
+        self.skip_below = skip_below
+
+    def mask(self, num_bytes):
+        if self.flipping_rate < self.skip_below:
+            return skip_mask(num_bytes, self.flipping_rate)
+        return threshold_mask(num_bytes, self.flipping_rate)
+
+    def transmit(self, packed_bits):
+        return packed_bits ^ self.mask(packed_bits.size).reshape(packed_bits.shape), None
+
+    def get_state(self):
+        # the masks are drawn from the global NumPy generator, a memoryless link has no state of its own
+        return {}
+
+    def set_state(self, state):
+        pass
+
+    def transmit_graph(self, bits):
+        flips = tf.random_uniform(tf.shape(bits), dtype=tf.float64) < self.flipping_rate
+        return tf.bitwise.bitwise_xor(bits, tf.cast(flips, bits.dtype))
+
+
+class GilbertElliottChannel(object):
+    """Two-state burst error channel.
+
+    Each bit the link leaves the good state with probability p_good_to_bad and the bad state with p_bad_to_good;
+    bits are flipped with flipping_rate_good or flipping_rate_bad. The state is carried over between calls.
+    """
+
+    def __init__(self, p_good_to_bad, p_bad_to_good, flipping_rate_good=0.0, flipping_rate_bad=0.5, chunk=1 << 16):
+        self.p_leave = np.array([p_good_to_bad, p_bad_to_good])
+        self.flipping_rates = np.array([flipping_rate_good, flipping_rate_bad])
+        self.chunk = chunk
+        # start in the stationary distribution
+        self.bad = np.random.random_sample() < p_good_to_bad / (p_good_to_bad + p_bad_to_good)
+
+    @classmethod
+    def with_average_rate(cls, flipping_rate, mean_burst=10, flipping_rate_bad=0.5):
+        """Error-free good state and bursts of mean_burst bits, flipping flipping_rate of the bits on average."""
+        if not 0 < flipping_rate < flipping_rate_bad:
+            raise ValueError('the average flipping rate has to be in (0, %g), got %g' % (flipping_rate_bad,
+                                                                                         flipping_rate))
+        bad_fraction = flipping_rate / flipping_rate_bad
+        p_bad_to_good = 1 / mean_burst
+        return cls(bad_fraction * p_bad_to_good / (1 - bad_fraction), p_bad_to_good, 0.0, flipping_rate_bad)
+
+    def states(self, num_bits):
+        # bad state indicator of the next num_bits bits, built from geometric run lengths
+        # self.bad is the state of the last bit sent, the first new bit follows it by one transition
+        bad = self.bad != (np.random.random_sample() < self.p_leave[int(self.bad)])
+        runs, states, total = [], [], 0
+        while total < num_bits:
+            expected = int(2 * (num_bits - total) * self.p_leave.min()) + 16
+            lengths = np.random.geometric(self.p_leave[[int(bad), int(not bad)]], (expected, 2)).ravel()
+            runs.append(lengths)
+            states.append(np.tile([bad, not bad], expected))
+            total += lengths.sum()
+        lengths, states = np.concatenate(runs), np.concatenate(states)
+        ends = np.cumsum(lengths)
+        last = np.searchsorted(ends, num_bits)  # the run the last bit belongs to
+        # runs are geometric, so the rest of the last run is again geometric and the state is all that is kept
+        self.bad = states[last]
+        lengths[last] -= ends[last] - num_bits
+        return np.repeat(states[:last + 1], lengths[:last + 1])
+
+    def get_state(self):
+        return {'bad': self.bad}
+
+    def set_state(self, state):
+        self.bad = state['bad']
+
+    def mask(self, num_bytes):
+        mask = np.empty(num_bytes, dtype=np.uint8)
+        for start in range(0, num_bytes, self.chunk):
+            stop = min(start + self.chunk, num_bytes)
+            rates = self.flipping_rates[self.states((stop - start) * 8).astype(int)]
+            mask[start:stop] = np.packbits(np.random.random_sample(rates.size) < rates)
+        return mask
+
+    def transmit(self, packed_bits):
+        return packed_bits ^ self.mask(packed_bits.size).reshape(packed_bits.shape), None
+
+
+class ErasureChannel(object):
+    """Bits are erased with erasure_rate, after going through channel (e.g. a BinarySymmetricChannel) if given."""
+
+    def __init__(self, erasure_rate, channel=None):
+        self.erasure = BinarySymmetricChannel(erasure_rate)
+        self.channel = channel
+
+    def get_state(self):
+        return {} if self.channel is None else self.channel.get_state()
+
+    def set_state(self, state):
+        if self.channel is not None:
+            self.channel.set_state(state)
+
+    def transmit(self, packed_bits):
+        if self.channel is not None:
+            packed_bits = self.channel.transmit(packed_bits)[0]
+        return packed_bits, self.erasure.mask(packed_bits.size).reshape(packed_bits.shape)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""quantization.py
+
+Scalar quantization of the scaled per sample losses, shared by the quantized feedback stages.
+
+A quantizer is given by its partition (Q - 1 increasing boundaries) and its codebook (Q values):
+a sample is mapped to the number of boundaries strictly below it, found by binary search in O(log Q),
+and an index is mapped back to its codebook value by table lookup. Indexes travel as num_bits bits,
+least significant bit first. Partitions and codebooks may be non-uniform and of any size;
+the uniform ones of num_bits bits on [0, 1] are given by uniform_partition() and uniform_codebook().
+
+All functions take arrays of any shape, the bits being added as a last axis of size num_bits.
+The graph versions (suffix _graph) give the same results as TF ops.
+On the host the feedback link carries packed bits: pack_indexes() sends the num_bits bits of every sample
+one after the other, as a serial link would, 8 bits per byte, and unpack_indexes() reverses it.
+
+AdaptiveQuantizer fits its partition and codebook to the distribution of the samples it is updated with:
+a running histogram on [0, 1] is kept, and Lloyd-Max (minimum mean squared error) or quantile cells
+(equally likely indexes) are refitted whenever the histogram has drifted from the one of the last fit.
+As the codebook changes between updates, feedback stages with an adaptive quantizer run on the host.
+Every refit costs a codebook transmission on the feedback link, counted by codebook_bits().
+
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def uniform_partition(num_bits):
+    return np.arange(1, 2 ** num_bits) / 2 ** num_bits
+
+
+def uniform_codebook(num_bits):
+    return np.arange(0, 2 ** num_bits) / 2 ** num_bits + 0.5 / 2 ** num_bits
+
+
+def quantize(samples, partition):
+    # number of partition boundaries strictly below each sample
+    return np.searchsorted(partition, samples, side='left')
+
+
+def de_quantize(indexes, codebook):
+    # indexes beyond the codebook (possible after bit errors when its size is not a power of two) take the last value
+    return codebook[np.minimum(indexes, codebook.size - 1)]
+
+
+def pack_indexes(indexes, num_bits):
+    # [ceil(N * num_bits / 8)] uint8 bytes of the N flattened indexes, sample after sample, least significant bit first
+    indexes = np.ravel(indexes).astype(np.min_scalar_type(2 ** num_bits - 1))
+    return np.packbits((indexes[:, None] >> np.arange(num_bits, dtype=indexes.dtype)) & 1)
+
+
+def unpack_indexes(packed_bits, num_samples, num_bits):
+    # the num_samples indexes of packed bits, padding bits of the last byte are dropped
+    bits = np.unpackbits(packed_bits, count=num_samples * num_bits).reshape(num_samples, num_bits)
+    indexes = np.zeros(num_samples, dtype=np.int64)
+    for bit in range(num_bits):
+        indexes |= bits[:, bit].astype(np.int64) << bit
+    return indexes
+
+
+def quantize_graph(samples, partition):
+    # tf.searchsorted searches along the last axis of 2-D inputs, so the samples are flattened
+    indexes = tf.searchsorted(tf.constant(partition, samples.dtype), tf.reshape(samples, [-1]), side='left')
+    return tf.reshape(indexes, tf.shape(samples))
+
+
+def de_quantize_graph(indexes, codebook):
+    return tf.gather(tf.constant(codebook, tf.float64), tf.minimum(indexes, codebook.size - 1))
+
+
+def int2bin_graph(indexes, num_bits):
+    return tf.bitwise.bitwise_and(tf.bitwise.right_shift(indexes[..., None], tf.range(num_bits)), 1)
+
+
+def bin2int_graph(bits):
+    return tf.reduce_sum(tf.bitwise.left_shift(bits, tf.range(tf.shape(bits)[-1])), -1)
+
+
+def centroids(distribution, centers, partition, fallback):
+    # mean of the histogram mass within every cell, fallback for empty cells
+    cells = np.searchsorted(partition, centers, side='left')
+    mass = np.bincount(cells, distribution, partition.size + 1)
+    moment = np.bincount(cells, distribution * centers, partition.size + 1)
+    return np.where(mass > 0, moment / np.maximum(mass, 1e-300), fallback)
+
+
+def quantile_quantizer(distribution, edges, num_levels):
+    """Partition and codebook with equally likely cells, for a histogram on the bins of edges."""
+    cdf = np.concatenate([[0], np.cumsum(distribution)])
+    cdf = cdf / cdf[-1]
+    partition = np.interp(np.arange(1, num_levels) / num_levels, cdf, edges)
+    bounds = np.concatenate([[edges[0]], partition, [edges[-1]]])
+    codebook = centroids(distribution, (edges[:-1] + edges[1:]) / 2, partition, (bounds[:-1] + bounds[1:]) / 2)
+    return partition, codebook
+
+
+def lloyd_max_quantizer(distribution, edges, num_levels, iterations=100, tolerance=1e-6):
+    """Partition and codebook of minimum mean squared error for a histogram, started from the quantile cells."""
+    centers = (edges[:-1] + edges[1:]) / 2
+    partition, codebook = quantile_quantizer(distribution, edges, num_levels)
+    for iteration in range(iterations):
+        new_partition = (codebook[:-1] + codebook[1:]) / 2  # nearest neighbour condition
+        codebook = centroids(distribution, centers, new_partition, codebook)  # centroid condition
+        converged = np.max(np.abs(new_partition - partition)) < tolerance
+        partition = new_partition
+        if converged:
+            break
+    return partition, codebook
+
+
+class ScalarQuantizer(object):
+    """Quantizer with the given partition and codebook, num_bits is the number of bits of an index."""
+
+    adaptive = False
+
+    def __init__(self, partition, codebook):
+        self.partition = np.asarray(partition, dtype=np.float64)
+        self.codebook = np.asarray(codebook, dtype=np.float64)
+        if self.codebook.size != self.partition.size + 1:
+            raise ValueError('a codebook of %d values needs %d partition boundaries, got %d'
+                             % (self.codebook.size, self.codebook.size - 1, self.partition.size))
+        self.num_bits = max(1, int(np.ceil(np.log2(self.codebook.size))))
+
+    @classmethod
+    def uniform(cls, num_bits):
+        return cls(uniform_partition(num_bits), uniform_codebook(num_bits))
+
+    def update(self, samples):
+        # a fixed quantizer ignores the samples
+        pass
+
+    def codebook_bits(self):
+        # bits spent on sending codebooks to the transmitter, which knows a fixed one in advance
+        return 0
+
+    def get_state(self):
+        # state carried across updates, saved in training checkpoints
+        return {}
+
+    def set_state(self, state):
+        pass
+
+    def quantize(self, samples):
+        return quantize(samples, self.partition)
+
+    def de_quantize(self, indexes):
+        return de_quantize(indexes, self.codebook)
+
+    def quantize_graph(self, samples):
+        return quantize_graph(samples, self.partition)
+
+    def de_quantize_graph(self, indexes):
+        return de_quantize_graph(indexes, self.codebook)
+
+
+class AdaptiveQuantizer(ScalarQuantizer):
+    """num_bits quantizer fitted to a running histogram of the samples on [0, 1], starting uniform.
+
+    method is 'lloyd_max' or 'quantile'. Every update() decays the histogram by decay before adding the samples,
+    and the quantizer is refitted when the total variation distance to the histogram of the last fit exceeds drift.
+    """
+
+    adaptive = True
+
+    def __init__(self, num_bits, method='lloyd_max', bins=256, decay=0.99, drift=0.05):
+        super(AdaptiveQuantizer, self).__init__(uniform_partition(num_bits), uniform_codebook(num_bits))
+        self.fit_function = {'lloyd_max': lloyd_max_quantizer, 'quantile': quantile_quantizer}[method]
+        self.edges = np.linspace(0, 1, bins + 1)
+        self.decay = decay
+        self.drift = drift
+        self.histogram = np.zeros(bins)
+        self.fitted_distribution = None
+        self.refits = 0
+
+    def update(self, samples):
+        bins = self.histogram.size
+        cells = np.minimum((np.ravel(samples) * bins).astype(int), bins - 1)
+        self.histogram = self.decay * self.histogram + np.bincount(cells, minlength=bins) / cells.size
+        distribution = self.histogram / np.sum(self.histogram)
+        if self.fitted_distribution is None or np.sum(np.abs(distribution - self.fitted_distribution)) / 2 > self.drift:
+            self.partition, self.codebook = self.fit_function(distribution, self.edges, self.codebook.size)
+            self.fitted_distribution = distribution
+            self.refits += 1
+
+    def codebook_bits(self):
+        # the receiver fits the quantizer and sends every new codebook to the transmitter, 64 bits per value
+        return 64 * self.codebook.size * self.refits
+
+    def get_state(self):
+        return {'partition': self.partition.copy(), 'codebook': self.codebook.copy(),
+                'histogram': self.histogram.copy(), 'fitted_distribution': self.fitted_distribution,
+                'refits': self.refits}
+
+    def set_state(self, state):
+        self.partition, self.codebook = state['partition'], state['codebook']
+        self.histogram, self.fitted_distribution = state['histogram'], state['fitted_distribution']
+        self.refits = state['refits']
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""realization_runner.py
+
+Parallel execution of independent training realizations.
+
+Every realization runs in a worker process of a process pool, in a fresh graph with its own session,
+so realizations do not share variables, optimizers or random generators.
+The realization function is called as function(sess, *args): it declares its FiberSystem in the default graph,
+initializes the variables with sess and returns its result (e.g. the SER).
+
+Each realization gets its own seed, derived from the run seed and its position in the list,
+so results are reproducible and do not depend on the number of workers.
+Intra-op threads of every worker are pinned, so that processes * threads does not oversubscribe the cores.
+
+Functions passed to run_realizations() must be importable by the workers, i.e. defined at module level,
+and scripts using it must guard their main code with if __name__ == '__main__'.
+
+"""
+
+import multiprocessing
+import os
+import numpy as np
+import tensorflow as tf
+
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+
+
+def realization_seeds(seed, num_realizations):
+    # independent streams for every realization, as 32-bit integers accepted by both NumPy and TF
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(num_realizations)]
+
+
+def run_realization(task):
+    function, args, seed, threads = task
+    np.random.seed(seed)
+    config = tf.ConfigProto(intra_op_parallelism_threads=threads, inter_op_parallelism_threads=1)
+    with tf.Graph().as_default():
+        tf.set_random_seed(seed)
+        with tf.Session(config=config) as sess:
+            return function(sess, *args)
+
+
+def collect_results(results, callback):
+    collected = []
+    for index, result in enumerate(results):
+        if callback is not None:
+            callback(index, result)
+        collected.append(result)
+    return collected
+
+
+def run_realizations(function, args_list, seed=0, processes=None, threads=1, seeds=None, callback=None):
+    """Run function(sess, *args) for every args in args_list; returns the results in the order of args_list.
+
+    processes defaults to the number of cores divided by threads, processes=1 runs in the calling process.
+    seeds overrides the seeds derived from seed, one per args.
+    callback(index, result) is called as soon as each result is available, in the order of args_list.
+    """
+    args_list = [tuple(args) for args in args_list]
+    if seeds is None:
+        seeds = realization_seeds(seed, len(args_list))
+    tasks = [(function, args, s, threads) for args, s in zip(args_list, seeds)]
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 1) // threads)
+    processes = min(processes, len(tasks))
+    if processes <= 1:
+        return collect_results(map(run_realization, tasks), callback)
+
+    # workers inherit the environment, so the thread limits hold for NumPy as well
+    saved = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in THREAD_VARIABLES})
+    try:
+        # TF does not survive fork, start clean interpreters instead
+        pool = multiprocessing.get_context('spawn').Pool(processes)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    with pool:
+        return collect_results(pool.imap(run_realization, tasks, chunksize=1), callback)
+
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""replay_buffer.py
+
+Replay buffer for the receiver training samples.
+
+Every main loop the receiver trains on rec_loops * batch_R copies of every message. Without a buffer all of them
+are new channel outputs; with a ReplayBuffer only fresh_ratio of them are simulated, the rest are drawn from
+the samples of the last max_age main loops, which were sent with a slightly older transmitter.
+Older samples are evicted, so the receiver never trains on constellations the transmitter has moved away from.
+The fewer fresh samples, the cheaper a main loop, and the more the receiver lags behind the transmitter.
+
+"""
+
+import numpy as np
+
+
+class ReplayBuffer(object):
+    """(label, received signal) pairs of the last max_age main loops, fresh_ratio of every batch is new.
+
+    seed is the job seed; the buffer draws from a child stream of it, so it is independent of the fiber channel,
+    which is seeded with the same value.
+    """
+
+    def __init__(self, fresh_ratio=0.25, max_age=10, seed=None):
+        self.fresh_ratio = fresh_ratio
+        self.max_age = max_age  # main loops a sample is kept for
+        self.rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+        self.age = 0  # number of batches drawn so far
+        self.chunks = []  # (age when added, labels, received signals), oldest first
+
+    def get_state(self):
+        # the stored chunks are never modified in place, so a copy of the list is a snapshot
+        return {'rng': self.rng.bit_generator.state, 'age': self.age, 'chunks': list(self.chunks)}
+
+    def set_state(self, state):
+        self.rng.bit_generator.state = state['rng']
+        self.age, self.chunks = state['age'], list(state['chunks'])
+
+    def stored(self):
+        return sum(labels.size for _, labels, _ in self.chunks)
+
+    def add(self, labels, received_signals):
+        self.chunks.append((self.age, labels, received_signals))
+        self.chunks = [chunk for chunk in self.chunks if chunk[0] > self.age - self.max_age]
+
+    def replay(self, num):
+        # num samples drawn without replacement from the stored ones
+        labels = np.concatenate([chunk[1] for chunk in self.chunks])
+        received_signals = np.concatenate([chunk[2] for chunk in self.chunks], axis=-1)
+        indexes = self.rng.choice(labels.size, num, replace=False)
+        return labels[indexes], received_signals[..., indexes]
+
+    def samples(self, sess, system, copies, input_power=None):
+        """Labels [copies * M] and received signals [..., 2, copies * M] to train the receiver on, shuffled."""
+        num = copies * system.M
+        fresh = max(int(np.ceil(self.fresh_ratio * copies)), copies - self.stored() // system.M)
+        labels = np.tile(system.message_indexes, fresh)
+        received_signals = system.received_signals(sess, fresh, input_power)
+        if fresh < copies:
+            replay_labels, replay_signals = self.replay(num - labels.size)
+            labels = np.concatenate([labels, replay_labels])
+            received_signals = np.concatenate([received_signals, replay_signals], axis=-1)
+        # the fresh signals may be a view of the channel buffer, which the next propagate() overwrites
+        self.add(labels[:fresh * system.M].copy(), received_signals[..., :fresh * system.M].copy())
+        self.age += 1
+        order = self.rng.permutation(num)
+        return labels[order], received_signals[..., order]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""results_store.py
+
+Append-only SQLite store of experiment results.
+
+Every finished realization is appended as one row, as soon as it finishes: the sweep name, its configuration key,
+the grid point and settings, the seed, the SER, the wall time and the training curves.
+Worker processes write their own rows; the database runs in WAL mode, so several processes can append
+to the same file while others read it, and a crash only loses the realizations still running.
+load() returns a whole sweep as NumPy arrays with a single query, ready for plotting.
+
+"""
+
+import contextlib
+import json
+import sqlite3
+import time
+import numpy as np
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    sweep TEXT NOT NULL,
+    key TEXT UNIQUE,
+    point TEXT,
+    settings TEXT,
+    realization INTEGER,
+    seed INTEGER,
+    SER REAL,
+    wall_time REAL,
+    loss_func BLOB,
+    reward_func BLOB,
+    created REAL)'''
+
+
+def to_blob(curve):
+    return None if curve is None else np.asarray(curve, dtype=np.float64).tobytes()
+
+
+def from_blob(blob):
+    return None if blob is None else np.frombuffer(blob, dtype=np.float64)
+
+
+class ResultsStore(object):
+    """Results database at path, opened with a fresh connection for every operation so it is safe across processes."""
+
+    def __init__(self, path='results.sqlite', timeout=60.0):
+        self.path = path
+        self.timeout = timeout  # seconds a writer waits for the lock held by another one
+        with self.connection() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(SCHEMA)
+            connection.execute('CREATE INDEX IF NOT EXISTS results_sweep ON results (sweep)')
+
+    @contextlib.contextmanager
+    def connection(self):
+        # one transaction per block, committed on success and always closed
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def append(self, sweep, SER, key=None, point=None, settings=None, realization=0, seed=None, wall_time=None,
+               loss_func=None, reward_func=None):
+        # rows are never overwritten, a second row with an existing key is ignored
+        with self.connection() as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO results (sweep, key, point, settings, realization, seed, SER, wall_time, '
+                'loss_func, reward_func, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (sweep, key, json.dumps(point, sort_keys=True), json.dumps(settings, sort_keys=True, default=str),
+                 realization, seed, float(SER), wall_time, to_blob(loss_func), to_blob(reward_func), time.time()))
+
+    def lookup(self, keys):
+        # SER of the keys already stored, as a dict key -> SER
+        keys = list(keys)
+        found = {}
+        with self.connection() as connection:
+            for start in range(0, len(keys), 500):  # stay below the SQLite limit on query parameters
+                batch = keys[start:start + 500]
+                rows = connection.execute('SELECT key, SER FROM results WHERE key IN (%s)' % ','.join('?' * len(batch)),
+                                          batch)
+                found.update(rows.fetchall())
+        return found
+
+    def load(self, sweep, curves=False, settings=None):
+        """All rows of sweep in insertion order, as a dict of arrays.
+
+        'SER', 'seed', 'realization' and 'wall_time' come with one array per grid point parameter
+        (e.g. 'input_power'); with curves=True also 'loss_func' and 'reward_func', stacked when of equal length.
+        If settings is given, only the rows appended with the same settings are returned.
+        """
+        columns = 'point, realization, seed, SER, wall_time' + (', loss_func, reward_func' if curves else '')
+        query, parameters = 'SELECT %s FROM results WHERE sweep = ?' % columns, (sweep,)
+        if settings is not None:
+            # settings are stored as sorted JSON, see append()
+            query += ' AND settings = ?'
+            parameters += (json.dumps(settings, sort_keys=True, default=str),)
+        with self.connection() as connection:
+            rows = connection.execute(query + ' ORDER BY id', parameters).fetchall()
+        if not rows:
+            return {}
+        values = list(zip(*rows))
+        points = [json.loads(point) for point in values[0]]
+        results = {'realization': np.array(values[1]), 'seed': np.array(values[2]),
+                   'SER': np.array(values[3], dtype=np.float64), 'wall_time': np.array(values[4], dtype=np.float64)}
+        for name in points[0]:
+            results[name] = np.array([point.get(name) for point in points])
+        if curves:
+            for name, blobs in zip(['loss_func', 'reward_func'], values[5:]):
+                curve_list = [from_blob(blob) for blob in blobs]
+                lengths = set(-1 if curve is None else len(curve) for curve in curve_list)
+                if len(lengths) == 1 and -1 not in lengths:
+                    results[name] = np.stack(curve_list)
+                else:
+                    results[name] = curve_list
+        return results
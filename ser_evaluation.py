@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""ser_evaluation.py
+
+Streaming symbol error rate evaluation of a trained FiberSystem.
+
+Symbols are simulated in fixed-size chunks: every chunk is sent through the NumPy fiber channel,
+the receiver returns only the decided message index, and running error counts are kept,
+so memory stays constant whatever the number of simulated symbols.
+
+adaptive_SER() keeps drawing chunks until the confidence interval of the estimate is tight enough,
+so high SER points stop after a few thousand symbols and low SER points get as many as they need.
+
+importance_sampling_SER() draws the channel noise from a biased distribution that makes errors frequent
+and weights every symbol error with its likelihood ratio, for SER values too low for plain Monte Carlo.
+
+"""
+
+import math
+import numpy as np
+
+
+def normal_quantile(p):
+    # inverse of the standard normal CDF by bisection, enough for confidence levels
+    low, high = -10.0, 10.0
+    for _ in range(0, 100):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def wilson_interval(errors, symbols, confidence=0.95):
+    # Wilson score interval of a binomial proportion, stays meaningful when no error has been observed
+    z = normal_quantile(0.5 + confidence / 2)
+    errors = np.asarray(errors, dtype=np.float64)
+    symbols = np.maximum(np.asarray(symbols, dtype=np.float64), 1)
+    center = (errors + z ** 2 / 2) / (symbols + z ** 2)
+    half_width = z / (symbols + z ** 2) * np.sqrt(errors * (symbols - errors) / symbols + z ** 2 / 4)
+    return center - half_width, center + half_width
+
+
+class SymbolErrorCounter(object):
+    """Running symbol error counts, one entry per input power when evaluating a sweep."""
+
+    def __init__(self, shape=()):
+        self.errors = np.zeros(shape, dtype=np.int64)
+        self.symbols = np.zeros(shape, dtype=np.int64)
+
+    def update(self, errors, symbols):
+        self.errors += errors
+        self.symbols += symbols
+
+    @property
+    def SER(self):
+        return self.errors / np.maximum(self.symbols, 1)
+
+    def interval(self, confidence=0.95):
+        return wilson_interval(self.errors, self.symbols, confidence)
+
+
+class WeightedErrorCounter(object):
+    """Running likelihood-ratio weighted error sums of an importance sampling estimate."""
+
+    def __init__(self, shape=()):
+        self.errors = np.zeros(shape)  # sum of the weights of the wrong decisions
+        self.squared_errors = np.zeros(shape)  # sum of the squared weights, for the variance
+        self.symbols = np.zeros(shape, dtype=np.int64)
+
+    def update(self, weighted_errors, squared_errors, symbols):
+        self.errors += weighted_errors
+        self.squared_errors += squared_errors
+        self.symbols += symbols
+
+    @property
+    def SER(self):
+        return self.errors / np.maximum(self.symbols, 1)
+
+    @property
+    def std_error(self):
+        symbols = np.maximum(self.symbols, 1)
+        return np.sqrt(np.maximum(self.squared_errors / symbols - self.SER ** 2, 0) / symbols)
+
+    def interval(self, confidence=0.95):
+        # normal approximation, the weighted errors are not binomial
+        z = normal_quantile(0.5 + confidence / 2)
+        return np.maximum(self.SER - z * self.std_error, 0), self.SER + z * self.std_error
+
+
+def symbol_errors(sess, system, constellation, labels, noise_scale=1):
+    # send constellation[..., labels] through the channel, wrong decisions as a [..., n] boolean array
+    # every realization of an ensemble gets its own noise, as during training
+    received_signals = system.channel.propagate(constellation, labels, noise_scale,
+                                                shared_noise=system.realizations is None)  # [..., 2, n]
+    return system.decide(sess, received_signals) != labels
+
+
+def count_symbol_errors(sess, system, constellation, labels):
+    # number of wrong decisions per leading entry
+    return np.sum(symbol_errors(sess, system, constellation, labels), axis=-1)
+
+
+def streaming_SER(sess, system, num=100000, input_power=None, chunk=8192):
+    """Simulate num copies of every message, chunk copies at a time; returns the SymbolErrorCounter.
+
+    input_power may be a vector, in which case all power levels are evaluated together.
+    For an ensemble system the counts are [..., R], one per realization.
+    """
+    constellation = system.constellation(sess, input_power)
+    counter = SymbolErrorCounter(constellation.shape[:-2])
+    chunk_labels = np.tile(system.message_indexes, min(chunk, num))
+    for start in range(0, num, chunk):
+        copies = min(chunk, num - start)
+        labels = chunk_labels[:copies * system.M]
+        counter.update(count_symbol_errors(sess, system, constellation, labels), labels.size)
+    return counter
+
+
+def compute_SER(sess, system, num=100000, input_power=None, chunk=8192):
+    return streaming_SER(sess, system, num, input_power, chunk).SER
+
+
+def compute_SER_sweep(sess, system, input_powers, num=100000, chunk=8192):
+    """SER of one trained system at every input power in input_powers.
+
+    All power levels go through the channel together, sharing the noise realization
+    (for an ensemble every power and realization has its own), and the receiver decides on one power at a time.
+    """
+    return streaming_SER(sess, system, num, np.asarray(input_powers, dtype=np.float64), chunk).SER
+
+
+def adaptive_SER(sess, system, rel_precision=0.1, min_errors=None, confidence=0.95, input_power=None,
+                 max_num=10 ** 7, first_chunk=256, chunk=8192):
+    """Draw chunks until the SER estimate is accurate enough; returns the SymbolErrorCounter.
+
+    An entry is done once the half width of its confidence interval is at most rel_precision * SER
+    (skipped if rel_precision is None) and at least min_errors errors were counted (skipped if None),
+    or once max_num copies of every message have been simulated.
+    Chunks start at first_chunk copies per message and double up to chunk; with a vector of input powers
+    the entries that are done are dropped from the following chunks.
+    """
+    constellation = system.constellation(sess, input_power)
+    lead_shape = constellation.shape[:-2]
+    # [P, 2, M], or [P, R, 2, M] for an ensemble, whose realizations stay active until all of them are done
+    constellation = constellation.reshape((-1,) + system.realization_shape + constellation.shape[-2:])
+    counter = SymbolErrorCounter(constellation.shape[:-2])
+    chunk_labels = np.tile(system.message_indexes, chunk)
+    active = np.ones(constellation.shape[0], dtype=bool)
+    copies = min(first_chunk, chunk, max_num)
+    while np.any(active):
+        labels = chunk_labels[:copies * system.M]
+        errors = count_symbol_errors(sess, system, constellation[active], labels)
+        counter.errors[active] += errors
+        counter.symbols[active] += labels.size
+
+        done = counter.symbols >= max_num * system.M
+        accurate = np.ones_like(done)
+        if rel_precision is not None:
+            low, high = counter.interval(confidence)
+            accurate &= (counter.errors > 0) & ((high - low) / 2 <= rel_precision * counter.SER)
+        if min_errors is not None:
+            accurate &= counter.errors >= min_errors
+        finished = (done | accurate).reshape(active.size, -1)
+        active &= ~np.all(finished, axis=1)
+        if np.any(active):
+            simulated = counter.symbols[active].flat[0] // system.M  # active entries share the same history
+            copies = min(2 * copies, chunk, max_num - simulated)
+
+    counter.errors = counter.errors.reshape(lead_shape)
+    counter.symbols = counter.symbols.reshape(lead_shape)
+    return counter
+
+
+def importance_sampling_SER(sess, system, noise_scale=3.0, num=10000, input_power=None, chunk=8192):
+    """Importance sampling estimate of the SER from num copies of every message; returns the WeightedErrorCounter.
+
+    The noise component common to all fiber segments is scaled by noise_scale (see FiberChannel.propagate),
+    and every error is weighted with the likelihood ratio of its noise realization, so the estimate stays unbiased.
+    noise_scale=1 gives the plain Monte Carlo estimate. input_power may be a vector, as in streaming_SER().
+    """
+    constellation = system.constellation(sess, input_power)
+    counter = WeightedErrorCounter(constellation.shape[:-2])
+    chunk_labels = np.tile(system.message_indexes, min(chunk, num))
+    for start in range(0, num, chunk):
+        copies = min(chunk, num - start)
+        labels = chunk_labels[:copies * system.M]
+        errors = symbol_errors(sess, system, constellation, labels, noise_scale)
+        weights = np.exp(system.channel.log_likelihood_ratio())
+        counter.update(np.sum(errors * weights, axis=-1), np.sum(errors * weights ** 2, axis=-1), labels.size)
+    return counter
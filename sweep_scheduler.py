@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""sweep_scheduler.py
+
+Parameter sweeps with a result cache.
+
+A grid such as {'input_power': np.arange(-15, 1), 'num_bits': [1, 2, 3]} is expanded into one job per point
+and realization, and the jobs run on the local cores through run_realizations() (see realization_runner.py).
+Every result is appended to the results store (see results_store.py) by the worker as soon as it is available,
+keyed by a hash of the full configuration: the function, the grid point, the settings the result depends on
+(learning rates, Main_loops, ...), the realization index and the sweep seed.
+Rerunning or extending a sweep only computes the missing points.
+
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import time
+import numpy as np
+from realization_runner import run_realizations
+from results_store import ResultsStore
+
+
+def expand_grid(grid):
+    """List of the points of grid, a dict of name -> values (product of all values) or a list of such dicts.
+
+    Scalar values are taken as a single value.
+    """
+    if isinstance(grid, dict):
+        grid = [grid]
+    points = []
+    for sub_grid in grid:
+        names = list(sub_grid)
+        values = [np.atleast_1d(sub_grid[name]).tolist() for name in names]
+        points.extend(dict(zip(names, point)) for point in itertools.product(*values))
+    return points
+
+
+def with_options(settings, **options):
+    """Copy of settings with the options that are not None.
+
+    Optional knobs (early stopping, replay buffer, ...) only enter the cache key when they are used,
+    so results computed without them keep their keys.
+    """
+    return dict(settings, **{name: value for name, value in options.items() if value is not None})
+
+
+def config_key(function, point, settings, realization, seed, ensemble=False):
+    # hash of everything the result depends on, plain python values only so that it is stable between runs
+    # the function is named after its file, scripts run as __main__ would otherwise all share one module name
+    name = os.path.basename(function.__code__.co_filename) + ':' + function.__name__
+    config = {'function': name, 'point': point, 'settings': settings, 'realization': realization, 'seed': seed}
+    if ensemble:
+        config['ensemble'] = True  # trained with other realizations, not interchangeable with a single run
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def split_result(result):
+    # job functions return the SER, or a dict with 'SER' and optionally the 'loss_func' and 'reward_func' curves
+    if isinstance(result, dict):
+        return result['SER'], result.get('loss_func'), result.get('reward_func')
+    return result, None, None
+
+
+def call_point(sess, function, point, store_path, sweep, keys, settings, seed, ensemble):
+    # runs in the worker: the rows are appended to the store right away, one per realization
+    start_time = time.time()
+    if ensemble:
+        result = function(sess, realizations=len(keys), **point)
+    else:
+        result = function(sess, **point)
+    wall_time = time.time() - start_time
+    SER, loss_func, reward_func = split_result(result)
+
+    store = ResultsStore(store_path)
+    SERs = np.reshape(SER, -1)
+    for realization, key in enumerate(keys):
+        if key is None:
+            continue  # already stored, trained again only as part of the ensemble
+        curves = [loss_func, reward_func]
+        if ensemble:
+            # an ensemble returns [R] SER values and [Main_loops, R] curves
+            curves = [None if curve is None else np.asarray(curve)[:, realization] for curve in curves]
+        store.append(sweep, SERs[realization], key, point, settings, realization, seed, wall_time, *curves)
+    return SERs.tolist() if ensemble else float(SER)
+
+
+def run_sweep(function, grid, settings=None, realizations=None, seed=0, sweep=None, store_path='results.sqlite',
+              processes=None, threads=None, ensemble=False):
+    """Run function(sess, **point) for every point of grid; returns the SER in the order of expand_grid(grid).
+
+    settings holds everything else the results depend on; it is only part of the cache key.
+    With realizations=R every point is run R times with independent seeds and its result is a list of R SER values.
+    Every job runs with threads intra-op threads (default 1) on processes worker processes.
+    With ensemble=True the R realizations of a point are trained together, as function(sess, realizations=R, **point),
+    in a single process using threads threads (default: all the cores).
+    Every realization is appended to the ResultsStore at store_path under the name sweep (default: the function name)
+    and realizations already in the store are not recomputed; their stored SER is returned, also when the other
+    realizations of their ensemble are trained again.
+    """
+    points = expand_grid(grid)
+    settings = {} if settings is None else settings
+    sweep = function.__name__ if sweep is None else sweep
+    store = ResultsStore(store_path)
+    indexes = range(1 if realizations is None else realizations)
+    keys = [[config_key(function, point, settings, index, seed, ensemble) for index in indexes] for point in points]
+    stored = store.lookup(key for point_keys in keys for key in point_keys)
+    results = [[stored.get(key) for key in point_keys] for point_keys in keys]
+
+    if ensemble:
+        if processes not in (None, 1):
+            raise ValueError('an ensemble sweep runs in a single process, got processes=%d' % processes)
+        # all realizations of a point are computed together, the ones already stored are not appended twice
+        jobs = [(p, list(indexes)) for p in range(len(points)) if None in results[p]]
+        threads = threads or os.cpu_count() or 1
+        processes = 1
+    else:
+        jobs = [(p, [r]) for p in range(len(points)) for r in indexes if results[p][r] is None]
+        threads = threads or 1
+    missing = sum(results[p][r] is None for p, job_indexes in jobs for r in job_indexes)
+    print('sweep %s: %d of %d realizations stored' % (sweep, len(points) * len(indexes) - missing,
+                                                      len(points) * len(indexes)))
+
+    def collect(job, result):
+        p, job_indexes = jobs[job]
+        for r, SER in zip(job_indexes, np.reshape(result, -1)):
+            if results[p][r] is None:
+                results[p][r] = SER
+
+    # the job seed is derived from its key, so it does not depend on which other jobs are missing
+    job_seeds = [int(keys[p][job_indexes[0]][:8], 16) for p, job_indexes in jobs]
+    # keys of the realizations already stored are passed as None, so that only the missing ones are appended
+    job_keys = [[None if results[p][r] is not None else keys[p][r] for r in job_indexes] for p, job_indexes in jobs]
+    run_realizations(call_point, [(function, points[p], store_path, sweep, point_keys, settings, s, ensemble)
+                                  for (p, job_indexes), point_keys, s in zip(jobs, job_keys, job_seeds)],
+                     seeds=job_seeds, processes=processes, threads=threads, callback=collect)
+    if realizations is None:
+        return [point_results[0] for point_results in results]
+    return results
@@ -0,0 +1,14 @@
+import numpy as np
+from feedback import StreamingQuantile
+
+
+def test_streaming_quantile_tracks_the_clip_ratio_quantile():
+    rng = np.random.default_rng(0)
+    quantile = StreamingQuantile(0.95)
+    for _ in range(30):
+        value = quantile.update(rng.exponential(0.3, 10000))
+    # exponential losses: the 95% quantile is -0.3 log(0.05)
+    assert abs(value / (-0.3 * np.log(0.05)) - 1) < 0.02
+    for _ in range(30):
+        value = quantile.update(rng.exponential(3.0, 10000))
+    assert abs(value / (-3.0 * np.log(0.05)) - 1) < 0.02
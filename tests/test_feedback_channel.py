@@ -0,0 +1,12 @@
+import numpy as np
+from feedback_channel import GilbertElliottChannel
+
+
+def test_gilbert_elliott_state_changes_between_calls():
+    # one bit per call: the chain has to move at the call boundaries alone
+    np.random.seed(0)
+    channel = GilbertElliottChannel(0.1, 0.5)
+    bad = np.concatenate([channel.states(1) for _ in range(50000)])
+    assert abs(np.mean(bad) - 0.1 / (0.1 + 0.5)) < 0.01
+    assert abs(np.mean(bad[1:][~bad[:-1]]) - 0.1) < 0.01  # good to bad
+    assert abs(np.mean(~bad[1:][bad[:-1]]) - 0.5) < 0.02  # bad to good
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+from quantization import (uniform_partition, uniform_codebook, quantize, de_quantize, pack_indexes, unpack_indexes,
+                          quantize_graph, de_quantize_graph, int2bin_graph, bin2int_graph, ScalarQuantizer,
+                          AdaptiveQuantizer)
+
+
+@pytest.mark.parametrize('num_bits', [1, 2, 3, 7, 8, 9, 16])
+@pytest.mark.parametrize('num_samples', [1, 7, 8, 1001])
+def test_pack_unpack_round_trip(num_bits, num_samples):
+    indexes = np.random.default_rng(num_bits).integers(0, 2 ** num_bits, num_samples)
+    packed = pack_indexes(indexes, num_bits)
+    assert packed.dtype == np.uint8
+    assert packed.size == -(-num_samples * num_bits // 8)
+    assert np.array_equal(unpack_indexes(packed, num_samples, num_bits), indexes)
+
+
+def test_pack_sends_the_bits_of_a_sample_together():
+    # least significant bit first, sample after sample: 1 -> 10, 2 -> 01, 3 -> 11
+    assert list(pack_indexes(np.array([1, 2, 3]), 2)) == [0b10011100]
+
+
+def test_unpack_of_a_flipped_bit_changes_one_sample():
+    indexes = np.zeros(10, dtype=int)
+    packed = pack_indexes(indexes, 3)
+    packed[0] ^= 0b00001000  # fifth bit on the link, bit 1 of sample 1
+    assert list(unpack_indexes(packed, 10, 3)) == [0, 2] + [0] * 8
+
+
+@pytest.mark.parametrize('num_bits', [1, 3])
+def test_quantize_matches_cell_search(num_bits):
+    samples = np.random.default_rng(0).random(1000)
+    partition = uniform_partition(num_bits)
+    indexes = quantize(samples, partition)
+    assert np.array_equal(indexes, np.minimum((samples * 2 ** num_bits).astype(int), 2 ** num_bits - 1))
+    assert np.all(np.abs(de_quantize(indexes, uniform_codebook(num_bits)) - samples) <= 0.5 / 2 ** num_bits)
+
+
+def test_graph_path_matches_host_path():
+    num_bits = 3
+    samples = np.concatenate([np.random.default_rng(0).random(999), uniform_partition(num_bits), [0, 1]])
+    partition, codebook = uniform_partition(num_bits), uniform_codebook(num_bits)
+    with tf.Graph().as_default(), tf.Session() as sess:
+        indexes = quantize_graph(tf.constant(samples.reshape(2, -1)), partition)
+        bits = int2bin_graph(indexes, num_bits)
+        graph_indexes, graph_values = sess.run([bin2int_graph(bits), de_quantize_graph(bin2int_graph(bits), codebook)])
+    assert np.array_equal(graph_indexes.ravel(), quantize(samples, partition))
+    assert np.array_equal(graph_values.ravel(), de_quantize(quantize(samples, partition), codebook))
+
+
+def test_every_refit_sends_a_codebook():
+    quantizer = AdaptiveQuantizer(2, drift=0.01)
+    for scale in [1, 2, 4, 8]:
+        quantizer.update(np.random.default_rng(scale).random(1000) ** scale)
+    assert quantizer.refits > 1
+    assert quantizer.codebook_bits() == 64 * 4 * quantizer.refits
+    assert ScalarQuantizer.uniform(2).codebook_bits() == 0
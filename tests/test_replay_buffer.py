@@ -0,0 +1,9 @@
+import numpy as np
+from replay_buffer import ReplayBuffer
+
+
+def test_stream_differs_from_the_channel_with_the_same_seed():
+    # the fiber channel draws from np.random.default_rng(seed) with the job seed
+    channel_rng = np.random.default_rng(7)
+    assert not np.array_equal(ReplayBuffer(seed=7).rng.permutation(1000), channel_rng.permutation(1000))
+    assert np.array_equal(ReplayBuffer(seed=7).rng.permutation(1000), ReplayBuffer(seed=7).rng.permutation(1000))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from channel_engine import FiberChannel
+from ser_evaluation import streaming_SER, importance_sampling_SER
+
+
+class RingSystem(object):
+    # 16 points on two rings with nearest neighbour decisions on the noiseless channel output,
+    # the parts of a FiberSystem the SER estimators use, without training
+    realizations = None
+    M = 16
+    message_indexes = np.arange(16)
+
+    def __init__(self, input_power=-4, seed=0):
+        angles = np.arange(16) * 2 * np.pi / 16
+        radii = np.where(np.arange(16) % 2, 1.0, 0.6)
+        points = np.stack([radii * np.cos(angles), radii * np.sin(angles)])
+        self.points = points / np.sqrt(np.mean(np.sum(points ** 2, axis=0)))
+        self.input_power = input_power
+        self.channel = FiberChannel(seed=seed)
+        self.reference = FiberChannel(noise_std=0).propagate(self.constellation(None)).copy()
+
+    def constellation(self, sess, input_power=None):
+        return np.sqrt(10 ** (self.input_power / 10) / 1000) * self.points
+
+    def decide(self, sess, received_signals):
+        distances = np.sum((received_signals[..., :, :, None] - self.reference[:, None, :]) ** 2, axis=-3)
+        return np.argmin(distances, axis=-1)
+
+
+@pytest.mark.parametrize('noise_scale', [1.5, 3.0])
+def test_importance_sampling_agrees_with_monte_carlo(noise_scale):
+    # SER around 2e-2, where plain Monte Carlo is accurate
+    monte_carlo = streaming_SER(None, RingSystem(seed=0), num=20000)
+    importance = importance_sampling_SER(None, RingSystem(seed=1), noise_scale=noise_scale, num=5000)
+    assert 0.01 < monte_carlo.SER < 0.05
+    low, high = monte_carlo.interval()
+    importance_low, importance_high = importance.interval()
+    half_widths = (high - low) / 2 + (importance_high - importance_low) / 2
+    assert abs(importance.SER - monte_carlo.SER) < half_widths
+
+
+def test_likelihood_ratio_without_bias_is_zero():
+    channel = FiberChannel(seed=0)
+    channel.propagate(np.ones((2, 1000)) * 1e-2)
+    assert np.all(channel.log_likelihood_ratio() == 0)
+
+
+@pytest.mark.parametrize('noise_scale', [2.0, 3.0])
+def test_likelihood_ratio_weights_have_mean_one(noise_scale):
+    # E_q[p / q] = 1 for samples drawn from the biased distribution q
+    channel = FiberChannel(seed=0)
+    channel.propagate(np.zeros((2, 200000)), noise_scale=noise_scale)
+    weights = np.exp(channel.log_likelihood_ratio())
+    assert abs(np.mean(weights) - 1) < 4 * np.std(weights) / np.sqrt(weights.size)
+
+
+def test_likelihood_ratio_per_leading_entry():
+    channel = FiberChannel(seed=0)
+    channel.propagate(np.zeros((3, 2, 100)), noise_scale=2.0, shared_noise=False)
+    ratios = channel.log_likelihood_ratio()
+    assert ratios.shape == (3, 100)
+    assert not np.allclose(ratios[0], ratios[1])
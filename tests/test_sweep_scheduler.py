@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from results_store import ResultsStore
+from sweep_scheduler import run_sweep
+
+calls = []
+
+
+def ensemble_point(sess, x, realizations=None):
+    calls.append(x)
+    return {'SER': np.full(realizations, len(calls) + x / 10)}
+
+
+def test_ensemble_returns_stored_realizations(tmp_path):
+    store_path = str(tmp_path / 'results.sqlite')
+    first = run_sweep(ensemble_point, {'x': 1}, realizations=2, sweep='s', store_path=store_path, ensemble=True)
+    # a third realization trains the ensemble again, the two stored ones keep their SER
+    second = run_sweep(ensemble_point, {'x': 1}, realizations=3, sweep='s', store_path=store_path, ensemble=True)
+    assert second[0][:2] == first[0]
+    assert second[0][2] != first[0][0]
+    stored = ResultsStore(store_path).load('s')
+    assert len(stored['SER']) == 3
+    assert sorted(stored['SER']) == sorted(second[0])
+
+
+def test_ensemble_rejects_several_processes(tmp_path):
+    with pytest.raises(ValueError):
+        run_sweep(ensemble_point, {'x': 1}, realizations=2, store_path=str(tmp_path / 'results.sqlite'),
+                  processes=4, ensemble=True)
@@ -0,0 +1,78 @@
+import copy
+import numpy as np
+import tensorflow as tf
+from feedback import FlippedFeedback
+from quantization import AdaptiveQuantizer
+from feedback_channel import GilbertElliottChannel
+from replay_buffer import ReplayBuffer
+from convergence_monitor import ConvergenceMonitor
+from training_checkpoint import TrainingCheckpoint
+
+
+class HostSystem(object):
+    """The parts of a FiberSystem of two realizations that a checkpoint touches."""
+
+    def __init__(self):
+        self.channel = type('Channel', (object,), {})()
+        self.channel.rng = np.random.default_rng(0)
+        self.stages = {}
+
+    def feedback_stages(self, feedback):
+        if id(feedback) not in self.stages:
+            self.stages[id(feedback)] = [feedback, copy.deepcopy(feedback)]
+        return self.stages[id(feedback)]
+
+
+def components():
+    feedback = FlippedFeedback(3, 0.1, quantizer=AdaptiveQuantizer(3, drift=0.01),
+                               channel=GilbertElliottChannel(0.01, 0.1), streaming=True)
+    return HostSystem(), feedback, ReplayBuffer(seed=1), ConvergenceMonitor()
+
+
+def step(system, feedback, replay, monitor, loop):
+    # one main loop of the host state: feedback of both realizations, replayed samples and the monitor history
+    sample_loss = np.random.exponential(1 + loop, (2, 1000))
+    received = [stage(row) for stage, row in zip(system.feedback_stages(feedback), sample_loss)]
+    replay.add(np.arange(16) + loop, np.random.normal(size=(2, 16)))
+    replay.age += 1
+    monitor.cross_entropy.append(np.atleast_1d(1.0 / (1 + loop)))
+    return received, replay.replay(8), system.channel.rng.normal(size=3)
+
+
+def test_resume_continues_the_host_state(tmp_path):
+    np.random.seed(0)
+    with tf.Graph().as_default(), tf.Session() as sess:
+        variable = tf.Variable(1.0)
+        sess.run(tf.global_variables_initializer())
+        system, feedback, replay, monitor = components()
+        for loop in range(5):
+            step(system, feedback, replay, monitor, loop)
+        checkpoint = TrainingCheckpoint(str(tmp_path), tag='test')
+        checkpoint.save(sess, system, 5, [1.0], [2.0], feedback, replay, monitor)
+        checkpoint.wait()
+        expected = step(system, feedback, replay, monitor, 5)
+        assert feedback.quantizer.refits > 1
+
+        variable.load(5.0, sess)
+        system, feedback, replay, monitor = components()
+        state = TrainingCheckpoint(str(tmp_path), tag='test').restore(sess, system, feedback, replay, monitor)
+        assert state['loop'] == 5
+        assert sess.run(variable) == 1.0
+        assert len(monitor.cross_entropy) == 5
+        resumed = step(system, feedback, replay, monitor, 5)
+
+    for realization in range(2):
+        assert np.array_equal(resumed[0][realization], expected[0][realization])
+    for resumed_part, expected_part in zip(resumed[1] + resumed[2:], expected[1] + expected[2:]):
+        assert np.array_equal(resumed_part, expected_part)
+
+
+def test_restore_skips_other_tags(tmp_path):
+    with tf.Graph().as_default(), tf.Session() as sess:
+        tf.Variable(1.0)
+        sess.run(tf.global_variables_initializer())
+        system = HostSystem()
+        checkpoint = TrainingCheckpoint(str(tmp_path), tag='one')
+        checkpoint.save(sess, system, 1, [], [])
+        checkpoint.wait()
+        assert TrainingCheckpoint(str(tmp_path), tag='other').restore(sess, system) is None
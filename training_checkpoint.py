@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""training_checkpoint.py
+
+Periodic checkpoints of a training run and automatic resume from the latest one.
+
+train() calls checkpoint.save() every `every` main loops. A checkpoint holds the values of all global variables
+(weights, Adam slots and power accumulators), the state of the NumPy random generators (the global one and
+the one of the fiber channel), the number of main loops done and the loss and reward curves so far.
+The state of the feedback stage (adaptive codebook, streaming clipping boundary, burst channel, for every
+realization of an ensemble), of the replay buffer and of the convergence monitor is saved too when train() has them,
+through their get_state() and set_state() methods.
+The variables are read with one session call; pickling and writing to disk happen on a background thread,
+so the training loop only waits for the disk when the previous checkpoint is still being written.
+Files are written under a temporary name and renamed, so a crash never leaves a truncated checkpoint.
+
+The random ops of the graph (policy perturbations) restart their sequence in a new session and are not restored.
+
+"""
+
+import glob
+import os
+import pickle
+import threading
+import numpy as np
+import tensorflow as tf
+
+
+class TrainingCheckpoint(object):
+    """Checkpoints in directory every `every` main loops, keeping the last max_to_keep of them.
+
+    tag identifies the configuration (e.g. the settings and the input power); checkpoints with another tag
+    are not resumed from.
+    """
+
+    def __init__(self, directory, every=500, max_to_keep=2, tag=None):
+        self.directory = directory
+        self.every = every
+        self.max_to_keep = max_to_keep
+        self.tag = tag
+        self.writer = None
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def path(self, loop):
+        return os.path.join(self.directory, 'checkpoint-%08d.pkl' % loop)
+
+    def checkpoints(self):
+        # completed checkpoint files, oldest first
+        return sorted(glob.glob(os.path.join(self.directory, 'checkpoint-*.pkl')))
+
+    def write(self, state):
+        path = self.path(state['loop'])
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        for old in self.checkpoints()[:-self.max_to_keep]:
+            os.remove(old)
+
+    def wait(self):
+        # block until the last checkpoint is on disk
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+
+    def save(self, sess, system, loop, loss_func, reward_func, feedback=None, replay=None, monitor=None):
+        """Checkpoint after loop main loops; returns without waiting for the disk."""
+        variables = tf.global_variables()
+        values = sess.run(variables)
+        state = {'tag': self.tag, 'loop': loop, 'variables': dict(zip([v.name for v in variables], values)),
+                 'loss_func': np.copy(loss_func), 'reward_func': np.copy(reward_func),
+                 'numpy_state': np.random.get_state(), 'channel_state': system.channel.rng.bit_generator.state}
+        if feedback is not None:
+            state['feedback_states'] = [stage.get_state() for stage in system.feedback_stages(feedback)]
+        if replay is not None:
+            state['replay_state'] = replay.get_state()
+        if monitor is not None:
+            state['monitor_state'] = monitor.get_state()
+        self.wait()
+        self.writer = threading.Thread(target=self.write, args=(state,))
+        self.writer.start()
+
+    def maybe_save(self, sess, system, loop, loss_func, reward_func, feedback=None, replay=None, monitor=None):
+        if loop % self.every == 0:
+            self.save(sess, system, loop, loss_func, reward_func, feedback, replay, monitor)
+
+    def restore(self, sess, system, feedback=None, replay=None, monitor=None):
+        """Restore the latest checkpoint with a matching tag; returns its state, or None if there is none."""
+        self.wait()
+        for path in reversed(self.checkpoints()):
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            if state['tag'] != self.tag:
+                continue
+            for variable in tf.global_variables():
+                if variable.name in state['variables']:
+                    variable.load(state['variables'][variable.name], sess)
+            np.random.set_state(state['numpy_state'])
+            system.channel.rng.bit_generator.state = state['channel_state']
+            if feedback is not None and 'feedback_states' in state:
+                for stage, stage_state in zip(system.feedback_stages(feedback), state['feedback_states']):
+                    stage.set_state(stage_state)
+            if replay is not None and 'replay_state' in state:
+                replay.set_state(state['replay_state'])
+            if monitor is not None and 'monitor_state' in state:
+                monitor.set_state(state['monitor_state'])
+            print('resumed from', path, 'after', state['loop'], 'main loops')
+            return state
+        return None
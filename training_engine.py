@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""training_engine.py
+
+Shared alternating training engine for the fiber optical scripts.
+
+FiberSystem declares the transmitter, the receiver and the fiber channel once,
+train() runs the receiver/transmitter alternating loop followed by the large-batch finale,
+and the per sample losses reach the transmitter through a feedback stage (see feedback.py).
+compute_SER() and compute_SER_sweep() (see ser_evaluation.py) evaluate a trained system.
+
+"""
+
+import copy
+import numpy as np
+import tensorflow as tf
+from channel_engine import FiberChannel, gamma, L, K, P_noise_dBm, sigma
+from ser_evaluation import compute_SER, compute_SER_sweep
+
+def normalization(in_message):  # normalize average energy to 1
+    # in_message is [2, N], or [R, 2, N] with one normalization per realization
+    m = tf.shape(in_message)[-1]
+    square = tf.square(in_message)
+    inverse_m = 1 / m
+    inverse_m = tf.cast(inverse_m, tf.float64)
+    E_abs = inverse_m * tf.reduce_sum(square, axis=[-2, -1], keepdims=True)
+    power_norm = tf.sqrt(E_abs)  # average power per message
+    y = in_message / power_norm  # average power per message normalized to 1
+    return y
+
+
+def power_constrain(signal_power_dBm, in_message):
+    P_in_W = 10 ** (signal_power_dBm / 10) / 1000  # W
+    P_in = tf.cast(P_in_W, tf.float64)
+    out_put = tf.sqrt(P_in) * in_message
+    return out_put
+
+
+def compute_loss(logits, labels, axis=None):
+    loss = tf.reduce_mean(compute_per_sample_loss(logits, labels), axis=axis)
+    return loss
+
+
+def perturbation(input_signal, sigma_pi):
+    noise = tf.random_normal(tf.shape(input_signal), mean=0.0, stddev=sigma_pi, dtype=tf.float64, seed=None, name=None)
+    perturbed_signal = input_signal + noise  # add perturbation so as to do exploration
+    return perturbed_signal
+
+
+def accumulation_step(optimizer, loss, var_list):
+    # gradients of loss, placeholders for their sum over micro-batches and the update applying the sum with optimizer
+    # (gathered weights have sparse gradients, they are made dense so that they can be added up on the host)
+    gradients = [tf.convert_to_tensor(gradient) for gradient in tf.gradients(loss, var_list)]
+    placeholders = [tf.placeholder(v.dtype.base_dtype, v.shape) for v in var_list]
+    return gradients, placeholders, optimizer.apply_gradients(zip(placeholders, var_list))
+
+
+def compute_per_sample_loss(logits, labels):
+    # this is actually the receiver, use the same training set as receiver, so that it knows what message is transmitted
+    # fused log-softmax and cross entropy on [N, M] logits and message indexes
+    # ([R, N, M] logits of an ensemble share the same [N] message indexes)
+    labels = tf.broadcast_to(labels, tf.shape(logits)[:-1])
+    sample_loss = tf.nn.sparse_softmax_cross_entropy_with_logits(labels=labels, logits=logits)
+    return sample_loss
+
+
+def policy_function(X_p, transmitter_output, sigma_pi):
+    gaussian_norm = tf.add(tf.square(X_p[..., 0, :] - transmitter_output[..., 0, :]),
+                           tf.square(X_p[..., 1, :] - transmitter_output[..., 1, :]))
+    sigma_pi_square = np.square(sigma_pi)
+    pi_theta = tf.multiply(1 / (np.pi * sigma_pi_square), tf.exp(-tf.divide(gaussian_norm, sigma_pi_square)))
+    return pi_theta
+
+
+def fiber_channel(noise_variance, channel_input):
+    # the noise of all K segments is drawn at once, the two quadratures are kept as separate rows
+    # channel_input is [..., 2, N], every leading entry gets its own noise
+    sigma_n = tf.cast(noise_variance, tf.float64)
+    noise = tf.random_normal(tf.concat([[K], tf.shape(channel_input)], 0), mean=0.0, stddev=sigma_n, dtype=tf.float64)
+    xr = channel_input[..., 0, :]
+    xi = channel_input[..., 1, :]
+    for k in range(0, K):
+        theta = gamma * L * (xr ** 2 + xi ** 2) / K
+        cos_theta = tf.cos(theta)
+        sin_theta = tf.sin(theta)
+        xr, xi = (xr * cos_theta - xi * sin_theta + noise[k, ..., 0, :],
+                  xr * sin_theta + xi * cos_theta + noise[k, ..., 1, :])
+    channel_output = tf.stack([xr, xi], -2)
+    return channel_output
+
+
+def xavier_slices(shape):
+    # xavier initialization of every [out, in] slice of a [R, out, in] variable, fans taken from the slice only
+    limit = np.sqrt(6.0 / (shape[-2] + shape[-1]))
+    return tf.random_uniform_initializer(-limit, limit, seed=1, dtype=tf.float64)
+
+
+def dense_layers(scope, sizes, realizations=None):
+    # sizes = [input, hidden, ..., output], one (weights, bias) pair per layer
+    # with realizations=R every variable gets a leading realization axis of size R
+    lead_shape = [] if realizations is None else [realizations]
+    with tf.variable_scope(scope):
+        W = []
+        B = []
+        prefix = scope[0]
+        for num_layer in range(1, len(sizes)):
+            w_name = 'W' + prefix + str(num_layer)
+            b_name = 'B' + prefix + str(num_layer)
+            w_shape = lead_shape + [sizes[num_layer], sizes[num_layer - 1]]
+            b_shape = lead_shape + [sizes[num_layer], 1]
+            if realizations is None:
+                w_initializer = tf.contrib.layers.xavier_initializer(seed=1)
+                b_initializer = tf.contrib.layers.xavier_initializer(seed=1)
+            else:
+                w_initializer = xavier_slices(w_shape)
+                b_initializer = xavier_slices(b_shape)
+            weights = tf.get_variable(w_name, w_shape, dtype='float64', initializer=w_initializer)
+            bias = tf.get_variable(b_name, b_shape, dtype='float64', initializer=b_initializer)
+            W.append(weights)
+            B.append(bias)
+    return W, B
+
+
+class FiberSystem(object):
+    """Transmitter, receiver and fiber channel together with their training ops.
+
+    The graph is added to the default graph; tensor names follow the original scripts.
+    INPUT_POWER defaults to P_in_dBm and only has to be fed when sweeping the input power.
+
+    With realizations=R, R independent systems are trained together as an ensemble: all weights get a leading
+    realization axis, the layers become batched matmuls, and signals, losses and decisions are [R, ...].
+    Every realization has its own channel noise, perturbations and feedback; the messages are shared.
+    """
+
+    def __init__(self, M=16, P_in_dBm=-5, sigma_pi=np.sqrt(0.0005), lr_receiver=0.008, lr_transmitter=0.001,
+                 tx_layers=3, rx_layers=3, NN_T=30, NN_R=50, receiver_in_graph=True, realizations=None):
+        self.M = M
+        self.P_in_dBm = P_in_dBm
+        self.sigma_pi = sigma_pi
+        self.channel = FiberChannel(seed=tf.get_default_graph().seed)  # reproducible when the graph seed is set
+        self.receiver_in_graph = receiver_in_graph
+        self.realizations = realizations
+        self.realization_shape = () if realizations is None else (realizations,)
+        self.sample_axis = None if realizations is None else -1  # losses are averaged per realization
+        lead_shape = list(self.realization_shape)
+
+        # messages and labels are integer indexes in [0, M)
+        self.message_indexes = np.arange(M)
+
+        self.WT, self.BT = dense_layers('Transmitter', [M] + [NN_T] * (tx_layers - 1) + [2], realizations)
+        self.WR, self.BR = dense_layers('Receiver', [2] + [NN_R] * (rx_layers - 1) + [M], realizations)
+
+        self.MESSAGES = tf.placeholder(tf.int32, [None])
+        self.LABELS = tf.placeholder(tf.int32, [None])
+        self.INPUT_POWER = tf.placeholder_with_default(tf.constant(P_in_dBm, tf.float64), [])
+        self.encoded_signals = self.transmitter(self.MESSAGES)
+        self.normalized_signals = normalization(self.encoded_signals)
+
+        # Train receiver:
+        self.R_power_cons_signals = power_constrain(self.INPUT_POWER, self.normalized_signals)
+        self.R_received_signals = fiber_channel(sigma, self.R_power_cons_signals)
+
+        self.RECEIVED_SIGNALS = tf.placeholder('float64', lead_shape + [2, None])
+        self.R_logits = self.receiver_logits(self.RECEIVED_SIGNALS)
+        self.R_probability_distribution = tf.matrix_transpose(tf.nn.softmax(self.R_logits))
+        self.R_decision = tf.argmax(self.R_logits, -1)
+        self.cross_entropy = compute_loss(self.R_logits, self.LABELS, self.sample_axis)
+        self.Rec_Var_list = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope='Receiver')
+        self.receiver_adam = tf.train.AdamOptimizer(learning_rate=lr_receiver)
+        # realizations share no variables, so minimizing the sum trains each one on its own loss
+        self.receiver_optimizer = self.receiver_adam.minimize(tf.reduce_sum(self.cross_entropy),
+                                                              var_list=self.Rec_Var_list)
+
+        # In-graph receiver training: all REC_LOOPS Adam steps run in one call over the fed sample buffer
+        self.RECEIVER_BUFFER = tf.placeholder('float64', lead_shape + [2, None])
+        self.BUFFER_LABELS = tf.placeholder(tf.int32, [None])
+        self.REC_LOOPS = tf.placeholder(tf.int32, [])
+        self.receiver_loop_cross_entropy = self.receiver_loop()
+
+        # Train Transmitter
+        self.perturbed_signals = perturbation(self.normalized_signals, sigma_pi)  # action taken by the agent
+        self.PERTURBED_SIGNALS = tf.placeholder('float64', lead_shape + [2, None])
+
+        self.T_power_cons_signals = power_constrain(self.INPUT_POWER, self.PERTURBED_SIGNALS)
+        self.T_received_signals = fiber_channel(sigma, self.T_power_cons_signals)  # constellation plots only
+        self.SAMPLE_LOSS = tf.placeholder('float64', [realizations or 1, None])
+
+        self.policy = policy_function(self.PERTURBED_SIGNALS, self.normalized_signals, sigma_pi)
+        self.reward_function = tf.reduce_mean(tf.multiply(self.SAMPLE_LOSS, tf.log(self.policy)),
+                                              axis=self.sample_axis)
+        self.Tran_Var_list = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope='Transmitter')
+        self.transmitter_adam = tf.train.AdamOptimizer(learning_rate=lr_transmitter)
+        self.transmitter_optimizer = self.transmitter_adam.minimize(tf.reduce_sum(self.reward_function),
+                                                                    var_list=self.Tran_Var_list)
+
+        # Large-batch finale: the gradients of micro-batches are summed on the host and applied in one Adam step,
+        # so the effective batch grows while the activations stay at the size of a micro-batch
+        self.receiver_accumulation = accumulation_step(self.receiver_adam, tf.reduce_sum(self.cross_entropy),
+                                                       self.Rec_Var_list)
+        self.transmitter_accumulation = accumulation_step(self.transmitter_adam, tf.reduce_sum(self.reward_function),
+                                                          self.Tran_Var_list)
+
+        # Fused transmitter step: the perturbation is sampled, sent through channel and receiver and
+        # scored in the same execution as the update; the action and the loss are treated as constants
+        self.F_perturbed_signals = tf.stop_gradient(self.perturbed_signals)  # action is constant
+        self.F_power_cons_signals = power_constrain(self.INPUT_POWER, self.F_perturbed_signals)
+        self.F_received_signals = fiber_channel(sigma, self.F_power_cons_signals)
+        self.F_logits = self.receiver_logits(self.F_received_signals)
+        self.F_per_sample_loss = tf.stop_gradient(compute_per_sample_loss(self.F_logits, self.MESSAGES))
+        self.F_policy = policy_function(self.F_perturbed_signals, self.normalized_signals, sigma_pi)
+        self.feedback_steps = {}
+        self.realization_stages = {}
+        # feedback link usage of the main loops and of the finale, see feedback_bits() of the feedback stages
+        self.reset_feedback_count()
+
+    def transmitter(self, in_message):
+        # in_message holds message indexes, the first layer picks the weight column of each message
+        # instead of multiplying with a one hot matrix
+        layer = tf.nn.relu(tf.add(tf.gather(self.WT[0], in_message, axis=-1), self.BT[0]))
+        for n_tx in range(1, len(self.WT) - 1):
+            layer = tf.nn.relu(tf.add(tf.matmul(self.WT[n_tx], layer), self.BT[n_tx]))
+        return tf.add(tf.matmul(self.WT[-1], layer), self.BT[-1])
+
+    def receiver_logits(self, in_symbols):
+        # the output layer is computed transposed, giving [N, M] logits for the fused cross entropy
+        layer = in_symbols
+        for n_rx in range(0, len(self.WR) - 1):
+            layer = tf.nn.relu(tf.add(tf.matmul(self.WR[n_rx], layer), self.BR[n_rx]))
+        return tf.add(tf.matmul(layer, self.WR[-1], transpose_a=True, transpose_b=True),
+                      tf.matrix_transpose(self.BR[-1]))
+
+    def receiver(self, in_symbols):
+        # output layer, [M, N] probabilities
+        return tf.matrix_transpose(tf.nn.softmax(self.receiver_logits(in_symbols)))
+
+    def receiver_loop(self):
+        # slot variables already exist (receiver_optimizer), so the Adam update can live inside the loop
+        batch_size = tf.shape(self.RECEIVER_BUFFER)[-1] // self.REC_LOOPS
+
+        def receiver_step(train_receiver_iteration, Cross_entropy):
+            start = train_receiver_iteration * batch_size
+            message_batch = self.RECEIVER_BUFFER[..., start:start + batch_size]
+            label_batch = self.BUFFER_LABELS[start:start + batch_size]
+            cross_entropy = compute_loss(self.receiver_logits(message_batch), label_batch, self.sample_axis)
+            receiver_optimizer = self.receiver_adam.minimize(tf.reduce_sum(cross_entropy), var_list=self.Rec_Var_list)
+            with tf.control_dependencies([receiver_optimizer]):
+                return train_receiver_iteration + 1, tf.identity(cross_entropy)
+
+        _, Cross_entropy = tf.while_loop(lambda i, _: i < self.REC_LOOPS, receiver_step,
+                                         [tf.constant(0), tf.zeros(self.realization_shape, tf.float64)],
+                                         parallel_iterations=1, back_prop=False)
+        return Cross_entropy
+
+    def power_feed(self, input_power):
+        if input_power is None:
+            return {}
+        return {self.INPUT_POWER: input_power}
+
+    def constellation(self, sess, input_power=None):
+        # power constrained transmitter output of every message, [2, M], or [P, 2, M] for a vector of powers
+        # (an ensemble gives [R, 2, M] and [P, R, 2, M])
+        # normalization over one copy of each message equals normalization over any tiled batch
+        normalized = sess.run(self.normalized_signals, feed_dict={self.MESSAGES: self.message_indexes})
+        if input_power is None:
+            input_power = self.P_in_dBm
+        P_in_W = 10 ** (np.asarray(input_power, dtype=np.float64) / 10) / 1000  # W
+        return np.sqrt(P_in_W).reshape(P_in_W.shape + (1,) * normalized.ndim) * normalized
+
+    def received_signals(self, sess, num, input_power=None):
+        # num copies of every message sent through the NumPy fiber channel, [2, num * M] or [P, 2, num * M]
+        # (an ensemble gives [R, 2, num * M], with independent noise for every realization)
+        labels = np.tile(np.arange(self.M), num)
+        return self.channel.propagate(self.constellation(sess, input_power), labels,
+                                      shared_noise=self.realizations is None)
+
+    def decide(self, sess, received_signals):
+        # receiver decisions for [..., 2, n] signals, [..., n]
+        # one receiver call per entry of the leading axes other than the realization axis (e.g. per input power),
+        # so the receiver activations stay at the size of one chunk
+        shape = received_signals.shape
+        received_signals = received_signals.reshape((-1,) + self.realization_shape + shape[-2:])
+        decisions = np.empty(received_signals.shape[:-2] + shape[-1:], dtype=np.int64)
+        for index, signals in enumerate(received_signals):
+            decisions[index] = sess.run(self.R_decision, feed_dict={self.RECEIVED_SIGNALS: signals})
+        return decisions.reshape(shape[:-2] + shape[-1:])
+
+    def train_receiver(self, sess, batch_R, rec_loops, input_power=None, replay=None):
+        # with a replay buffer (see replay_buffer.py) only part of the samples are new channel outputs
+        if replay is None:
+            train_samples = np.tile(self.message_indexes, rec_loops * batch_R)
+            # constant samples to train receiver
+            rec_sig = self.received_signals(sess, rec_loops * batch_R, input_power)
+        else:
+            train_samples, rec_sig = replay.samples(sess, self, rec_loops * batch_R, input_power)
+        if self.receiver_in_graph:
+            return sess.run(self.receiver_loop_cross_entropy,
+                            feed_dict={self.RECEIVER_BUFFER: rec_sig, self.BUFFER_LABELS: train_samples,
+                                       self.REC_LOOPS: rec_loops})
+
+        Cross_entropy = None
+        for train_receiver_iteration in range(0, rec_loops):
+            indexes = np.arange(train_receiver_iteration * batch_R * self.M,
+                                (train_receiver_iteration + 1) * batch_R * self.M)
+            label_batch = train_samples[indexes]
+            message_batch = np.copy(rec_sig[..., indexes])
+            Cross_entropy, _ = sess.run([self.cross_entropy, self.receiver_optimizer],
+                                        feed_dict={self.RECEIVED_SIGNALS: message_batch, self.LABELS: label_batch})
+        return Cross_entropy
+
+    def accumulated_step(self, sess, loss, accumulation, batches):
+        # batches yields (weight, feed_dict) pairs, one Adam step with the weighted sum of their gradients
+        gradients, placeholders, apply_gradients = accumulation
+        total_loss = 0
+        total_gradients = [0] * len(gradients)
+        for weight, feed_dict in batches:
+            values = sess.run([loss] + gradients, feed_dict=feed_dict)
+            total_loss = total_loss + weight * values[0]
+            total_gradients = [total + weight * value for total, value in zip(total_gradients, values[1:])]
+        sess.run(apply_gradients, feed_dict=dict(zip(placeholders, total_gradients)))
+        return total_loss
+
+    def train_receiver_accumulated(self, sess, batch_R, rec_loops, micro_batch, input_power=None):
+        # rec_loops Adam steps on batch_R copies of every message, generated micro_batch copies at a time
+        def batches():
+            for start in range(0, batch_R, micro_batch):
+                copies = min(micro_batch, batch_R - start)
+                yield copies / batch_R, {self.RECEIVED_SIGNALS: self.received_signals(sess, copies, input_power),
+                                         self.LABELS: np.tile(self.message_indexes, copies)}
+
+        Cross_entropy = None
+        for train_receiver_iteration in range(0, rec_loops):
+            Cross_entropy = self.accumulated_step(sess, self.cross_entropy, self.receiver_accumulation, batches())
+        return Cross_entropy
+
+    def train_transmitter_accumulated(self, sess, feedback, batch_T, tran_loops, micro_batch, input_power=None):
+        # tran_loops Adam steps on batch_T copies of every message, perturbed and scored micro_batch copies at a time
+        # the feedback stage is applied on the host to the sample losses of the whole batch, as in a normal step
+        starts = range(0, batch_T, micro_batch)
+        sizes = [min(micro_batch, batch_T - start) for start in starts]
+        Reward_function = None
+        for train_transmitter_iteration in range(0, tran_loops):
+            self.count_feedback(feedback, batch_T * self.M, 'finale')
+            perturbed_sig, sample_loss = [], []
+            for copies in sizes:
+                feed_dict = self.power_feed(input_power)
+                feed_dict[self.MESSAGES] = np.tile(self.message_indexes, copies)
+                values = sess.run([self.F_perturbed_signals, self.F_per_sample_loss], feed_dict=feed_dict)
+                perturbed_sig.append(values[0])
+                sample_loss.append(values[1].reshape((-1, copies * self.M)))
+            sample_loss = np.concatenate(sample_loss, axis=-1)
+            rec_sample_loss = self.host_feedback(feedback, sample_loss, 'finale')
+            batches = ((copies / batch_T,
+                        {self.MESSAGES: np.tile(self.message_indexes, copies), self.PERTURBED_SIGNALS: signals,
+                         self.SAMPLE_LOSS: rec_sample_loss[:, start * self.M:(start + copies) * self.M]})
+                       for start, copies, signals in zip(starts, sizes, perturbed_sig))
+            Reward_function = self.accumulated_step(sess, self.reward_function, self.transmitter_accumulation,
+                                                    batches)
+        return Reward_function
+
+    def reset_feedback_count(self):
+        self.feedback_bits = {'main': 0, 'finale': 0}
+        self.transmitter_updates = {'main': 0, 'finale': 0}
+
+    def count_feedback(self, feedback, num_samples, phase='main'):
+        # every realization sends its own sample losses
+        self.feedback_bits[phase] += feedback.feedback_bits(num_samples * (self.realizations or 1))
+        self.transmitter_updates[phase] += 1
+
+    def feedback_bits_per_update(self, phase='main'):
+        # phase is 'main' for the main loops or 'finale' for the large-batch finale
+        return self.feedback_bits[phase] / max(self.transmitter_updates[phase], 1)
+
+    def feedback_stages(self, feedback):
+        # every realization goes through its own copy of a host feedback stage, so that stages with state
+        # (adaptive codebooks, streaming clipping boundaries, burst channels) do not mix the realizations
+        key = id(feedback)
+        if key not in self.realization_stages:
+            self.realization_stages[key] = [feedback] + [copy.deepcopy(feedback)
+                                                         for _ in range(1, self.realizations or 1)]
+        return self.realization_stages[key]
+
+    def host_feedback(self, feedback, sample_loss, phase='main'):
+        # [R, N] sample losses, one row per copy of the stage
+        # codebooks sent by adaptive quantizers during the update are counted on top of the sample losses
+        stages = self.feedback_stages(feedback)
+        codebook_bits = sum(stage.codebook_bits() for stage in stages)
+        rec_sample_loss = np.array([stage(row) for stage, row in zip(stages, sample_loss)])
+        self.feedback_bits[phase] += sum(stage.codebook_bits() for stage in stages) - codebook_bits
+        return rec_sample_loss
+
+    def feedback_step(self, feedback):
+        # fused transmitter update with the feedback stage expressed as graph ops, built once per feedback stage
+        # the optimizer is shared with transmitter_optimizer, so no new Adam slots are created
+        key = id(feedback)
+        if key not in self.feedback_steps:
+            rec_sample_loss = tf.stop_gradient(feedback.graph(self.F_per_sample_loss))
+            reward_function = tf.reduce_mean(tf.multiply(rec_sample_loss, tf.log(self.F_policy)),
+                                             axis=self.sample_axis)
+            transmitter_optimizer = self.transmitter_adam.minimize(tf.reduce_sum(reward_function),
+                                                                   var_list=self.Tran_Var_list)
+            self.feedback_steps[key] = (feedback, reward_function, transmitter_optimizer)
+        return self.feedback_steps[key][1:]
+
+    def train_transmitter(self, sess, feedback, batch_T, tran_loops, input_power=None):
+        Reward_function = None
+        label_batch = np.tile(self.message_indexes, batch_T)
+        feed_dict = self.power_feed(input_power)
+        feed_dict[self.MESSAGES] = label_batch
+        for train_transmitter_iteration in range(0, tran_loops):
+            self.count_feedback(feedback, label_batch.size)
+            if getattr(feedback, 'graph', None) is not None:
+                # one session call per transmitter update
+                reward_function, transmitter_optimizer = self.feedback_step(feedback)
+                Reward_function, _ = sess.run([reward_function, transmitter_optimizer], feed_dict=feed_dict)
+            else:
+                # feedback stages without graph ops are applied on the host
+                perturbed_sig, sample_loss_constant = sess.run([self.F_perturbed_signals, self.F_per_sample_loss],
+                                                               feed_dict=feed_dict)
+                sample_loss_constant = sample_loss_constant.reshape((-1, label_batch.size))
+                rec_sample_loss = self.host_feedback(feedback, sample_loss_constant)
+                Reward_function, _ = sess.run([self.reward_function, self.transmitter_optimizer],
+                                              feed_dict={self.MESSAGES: label_batch,
+                                                         self.PERTURBED_SIGNALS: perturbed_sig,
+                                                         self.SAMPLE_LOSS: rec_sample_loss})
+        return Reward_function
+
+
+def train(sess, system, feedback, Main_loops=4000, batch_R=64, batch_T=64, tran_loops=20, rec_loops=30,
+          finale_rounds=10, finale_scale=100, input_power=None, callback=None, print_every=500, monitor=None,
+          checkpoint=None, finale_micro_batch=None, replay=None):
+    """Alternating training of receiver and transmitter, followed by the large-batch finale.
+
+    After Main_loops iterations, finale_rounds more iterations are run with batch sizes increased
+    finale_scale times so as to reduce the variance introduced by mini-batches.
+    The finale streams micro-batches of finale_micro_batch copies of every message and accumulates their gradients,
+    by default batch_T copies for the transmitter and rec_loops * batch_R for the receiver, the sizes of the main
+    loops, so the finale needs no more memory than a main loop whatever finale_scale is.
+    callback(sess, loop) is called at the end of every main loop.
+    If monitor is given (see convergence_monitor.py), the main loops stop as soon as
+    monitor.update(sess, system, loop, Cross_entropy, Reward_function) returns True.
+    If checkpoint is given (see training_checkpoint.py), training resumes from its latest checkpoint
+    and a new one is written every checkpoint.every main loops.
+    If replay is given (see replay_buffer.py), the receiver trains on a mix of new and replayed samples.
+    The feedback bits are counted from the start of every call, separately for the main loops and the finale
+    (see FiberSystem.feedback_bits_per_update()).
+    Returns the cross entropy and the reward recorded at every main loop ([Main_loops, R] for an ensemble).
+    """
+    loss_func = []
+    reward_func = []
+    start = 0
+    system.reset_feedback_count()
+    state = None if checkpoint is None else checkpoint.restore(sess, system, feedback, replay, monitor)
+    if state is not None:
+        start, loss_func, reward_func = state['loop'], state['loss_func'], state['reward_func']
+    for loop in range(start, Main_loops):
+        if print_every and loop % print_every == 0:
+            print('num of iterations=', loop)
+
+        Cross_entropy = system.train_receiver(sess, batch_R, rec_loops, input_power, replay)
+        Reward_function = system.train_transmitter(sess, feedback, batch_T, tran_loops, input_power)
+        loss_func = np.append(loss_func, Cross_entropy)
+        reward_func = np.append(reward_func, Reward_function)
+
+        if callback is not None:
+            callback(sess, loop)
+        if checkpoint is not None:
+            checkpoint.maybe_save(sess, system, loop + 1, loss_func, reward_func, feedback, replay, monitor)
+        if monitor is not None and monitor.update(sess, system, loop, Cross_entropy, Reward_function):
+            break
+
+    # run some more iterations with increased batch size so as to reduce variance introduced by mini-batch
+    # These codes are not necessary but can somewhat improve the performance
+    for more_iterations in range(0, finale_rounds):
+        system.train_transmitter_accumulated(sess, feedback, batch_T * finale_scale, tran_loops,
+                                             finale_micro_batch or batch_T, input_power)
+        system.train_receiver_accumulated(sess, batch_R * finale_scale, rec_loops,
+                                          finale_micro_batch or rec_loops * batch_R, input_power)
+    if checkpoint is not None:
+        checkpoint.wait()
+
+    if print_every:
+        print('feedback bits per transmitter update: main loops %d, finale %d'
+              % (system.feedback_bits_per_update('main'), system.feedback_bits_per_update('finale')))
+    loss_func = np.reshape(loss_func, (-1,) + system.realization_shape)
+    reward_func = np.reshape(reward_func, (-1,) + system.realization_shape)
+    return loss_func, reward_func